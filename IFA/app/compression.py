@@ -0,0 +1,187 @@
+import gzip
+import zlib
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from app.config import COMPRESSION_MIN_BYTES, GZIP_LEVEL, BROTLI_QUALITY
+
+try:
+    import brotli
+except ImportError:  # Sans le module brotli, seul gzip est proposé
+    brotli = None
+
+# Encodages proposés, par ordre de préférence à qualité égale
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Types de contenu déjà compressés, transmis tels quels
+COMPRESSED_MEDIA_TYPES = ("application/vnd.apache.parquet",)
+
+# Au-delà de cette taille, un bloc est compressé dans un thread pour ne pas bloquer la boucle d'événements
+THREAD_COMPRESSION_BYTES = 64 * 1024
+
+
+def negotiate_encoding(accept_encoding):
+    """Encodage de la réponse d'après l'en-tête Accept-Encoding (valeurs q prises en compte), ou None."""
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compressible(media_type):
+    """Indique si un type de contenu gagne à être compressé."""
+    return not (media_type or "").startswith(COMPRESSED_MEDIA_TYPES)
+
+
+def compress(data, encoding):
+    """Compresse une réponse complète (gzip sans date dans l'en-tête : même entrée, mêmes octets)."""
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def encoded_etag(etag, encoding):
+    """ETag de la version compressée d'une réponse (chaque encodage est une représentation distincte)."""
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def decoded_etag(etag):
+    """ETag de la réponse non compressée correspondant à un ETag éventuellement suffixé par un encodage."""
+    for encoding in ("br", "gzip"):
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+class StreamCompressor:
+    """Compression d'une réponse envoyée bloc par bloc ; chaque bloc est décodable dès sa réception."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data, last=False):
+        """Compresse un bloc ; le dernier (`last`) termine le flux."""
+        if self.encoding == "br":
+            return self._compressor.process(data) + (self._compressor.finish() if last else self._compressor.flush())
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    Compresse en gzip ou brotli (selon Accept-Encoding) les réponses d'au moins
+    `minimum_size` octets, y compris celles envoyées bloc par bloc.
+
+    Les réponses déjà encodées (réponses pré-compressées du cache de résultats),
+    les formats déjà compressés (Parquet) et les réponses sans corps sont
+    transmis tels quels.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+            if encoding is not None:
+                await CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class CompressionResponder:
+    """Compression d'une réponse : l'en-tête n'est envoyé qu'une fois le premier bloc reçu."""
+
+    def __init__(self, app, encoding, minimum_size):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start = None
+        self.passthrough = False
+        self.compressor = None
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            self.start = message
+            self.passthrough = (
+                "content-encoding" in headers
+                or not compressible(headers.get("content-type"))
+                or message["status"] in (204, 304)
+            )
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None and not self.passthrough:
+            # Petite réponse complète : la compression ne vaut pas son coût
+            self.passthrough = not more_body and len(body) < self.minimum_size
+
+        if self.passthrough:
+            await self.send_start()
+            await self.send(message)
+            return
+
+        if self.compressor is None:
+            headers = MutableHeaders(raw=self.start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "etag" in headers:
+                headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+
+            if not more_body:
+                body = await self.run(compress, body, self.encoding)
+                headers["Content-Length"] = str(len(body))
+                await self.send_start()
+                await self.send({"type": "http.response.body", "body": body})
+                return
+
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            self.compressor = StreamCompressor(self.encoding)
+            await self.send_start()
+
+        data = await self.run(self.compressor.compress, body, not more_body)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    @staticmethod
+    async def run(fn, data, *args):
+        if len(data) >= THREAD_COMPRESSION_BYTES:
+            return await run_in_threadpool(fn, data, *args)
+        return fn(data, *args)
+
+    async def send_start(self):
+        if self.start is not None:
+            await self.send(self.start)
+            self.start = None
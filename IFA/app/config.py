@@ -8,4 +8,71 @@ load_dotenv()
 WATSONX_APIKEY = os.getenv("WATSONX_APIKEY", "")
 WATSONX_PROJECT_ID = os.getenv("WATSONX_PROJECT_ID", "")
 WATSONX_URL = os.getenv("WATSONX_URL", "")
-CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY", "")
\ No newline at end of file
+CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY", "")
+
+# Client Watsonx du forecasting : service IAM et version de l'API, délais (secondes), tentatives
+# sur erreur transitoire et attente de base entre elles, connexions HTTP gardées ouvertes ;
+# WATSONX_STUB=1 sert les appels localement (tests hors ligne)
+WATSONX_IAM_URL = os.getenv("WATSONX_IAM_URL", "https://iam.cloud.ibm.com/identity/token")
+WATSONX_API_VERSION = os.getenv("WATSONX_API_VERSION", "2024-10-10")
+WATSONX_TIMEOUT_SECONDS = float(os.getenv("WATSONX_TIMEOUT_SECONDS", "60"))
+WATSONX_CONNECT_TIMEOUT_SECONDS = float(os.getenv("WATSONX_CONNECT_TIMEOUT_SECONDS", "5"))
+WATSONX_MAX_RETRIES = int(os.getenv("WATSONX_MAX_RETRIES", "3"))
+WATSONX_BACKOFF_SECONDS = float(os.getenv("WATSONX_BACKOFF_SECONDS", "0.5"))
+WATSONX_MAX_CONNECTIONS = int(os.getenv("WATSONX_MAX_CONNECTIONS", "10"))
+WATSONX_STUB = os.getenv("WATSONX_STUB", "0").lower() in ("1", "true", "yes")
+
+# Cache des réponses sérialisées des KPIs (nombre maximal d'entrées)
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+
+# Cache des fichiers uploadés : budget mémoire (octets) et durée de vie (secondes, 0 = illimitée)
+DATASET_CACHE_MAX_BYTES = int(os.getenv("DATASET_CACHE_MAX_BYTES", str(4 * 1024 ** 3)))
+DATASET_CACHE_TTL_SECONDS = int(os.getenv("DATASET_CACHE_TTL_SECONDS", "0"))
+
+# Cache persistant des jeux de données (Arrow IPC) ; une valeur vide le désactive
+DISK_CACHE_DIR = os.getenv("DISK_CACHE_DIR", ".cache/datasets")
+
+# Ingestion des uploads en tâche de fond : nombre de parsings simultanés et de tâches conservées
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_JOBS = int(os.getenv("INGEST_MAX_JOBS", "1000"))
+
+# État des tâches d'ingestion partagé entre workers uvicorn ; une valeur vide le garde en mémoire
+INGEST_JOBS_DIR = os.getenv("INGEST_JOBS_DIR", ".cache/jobs")
+
+# Pool de calcul des KPIs, du forecasting et des scores ("process" ou "thread"), nombre de workers,
+# tâches en cours ou en attente par file (au-delà : 429), attente maximale d'un worker (au-delà : 503)
+# et budget mémoire (octets) des jeux de données gardés ouverts par chaque processus de calcul
+COMPUTE_EXECUTOR = os.getenv("COMPUTE_EXECUTOR", "process")
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", str(os.cpu_count() or 1)))
+COMPUTE_MAX_PENDING = int(os.getenv("COMPUTE_MAX_PENDING", "64"))
+COMPUTE_QUEUE_TIMEOUT_SECONDS = float(os.getenv("COMPUTE_QUEUE_TIMEOUT_SECONDS", "30"))
+COMPUTE_WORKER_CACHE_BYTES = int(os.getenv("COMPUTE_WORKER_CACHE_BYTES", str(512 * 1024 ** 2)))
+
+# Lecture des enregistrements bruts (/data) : lignes converties par bloc
+DATA_CHUNK_ROWS = int(os.getenv("DATA_CHUNK_ROWS", "10000"))
+
+# Moteur de forecasting par défaut : "watsonx" (Granite TTM distant), "ridge" ou "seasonal_naive" (locaux)
+FORECAST_ENGINE = os.getenv("FORECAST_ENGINE", "watsonx")
+
+# Forecasting par lots : séries prévues ensemble (un appel multi-séries au moteur) et lots en cours simultanément
+FORECAST_BATCH_SERIES = int(os.getenv("FORECAST_BATCH_SERIES", "64"))
+FORECAST_BATCH_CONCURRENCY = int(os.getenv("FORECAST_BATCH_CONCURRENCY", "4"))
+
+# Backtesting : écart entre deux origines (heures), origines évaluées par série, horizons
+# résumés (heures), fenêtres prévues par appel au moteur et tâches en cours simultanément
+BACKTEST_STEP_HOURS = int(os.getenv("BACKTEST_STEP_HOURS", "24"))
+BACKTEST_MAX_ORIGINS = int(os.getenv("BACKTEST_MAX_ORIGINS", "30"))
+BACKTEST_HORIZONS = [int(hours) for hours in os.getenv("BACKTEST_HORIZONS", "1,6,12,24,48,96").split(",")]
+BACKTEST_BATCH_WINDOWS = int(os.getenv("BACKTEST_BATCH_WINDOWS", "16"))
+BACKTEST_CONCURRENCY = int(os.getenv("BACKTEST_CONCURRENCY", "4"))
+
+# Cache persistant des prévisions (une valeur vide le désactive), durée de vie (secondes, 0 = illimitée)
+# et nombre maximal de prévisions conservées (0 = illimité)
+FORECAST_CACHE_DIR = os.getenv("FORECAST_CACHE_DIR", ".cache/forecasts")
+FORECAST_CACHE_TTL_SECONDS = int(os.getenv("FORECAST_CACHE_TTL_SECONDS", str(24 * 3600)))
+FORECAST_CACHE_MAX_ENTRIES = int(os.getenv("FORECAST_CACHE_MAX_ENTRIES", "10000"))
+
+# Compression des réponses (gzip, brotli) : taille minimale compressée (octets) et niveaux de compression
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
\ No newline at end of file
@@ -1,6 +1,10 @@
 # Importation des modules FastAPI après chargement des variables
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.compression import CompressionMiddleware
+from app.services.compute_pool import compute_pool
+from app.services.watsonx_client import close_watsonx_client
 
 # Importation des routers
 from app.routes.heart import router as heart_router
@@ -12,9 +16,18 @@ from app.routes.forecast import router as forecast_router
 from app.routes.scores import router as scores_router
 from app.routes.report import router as report_router
 from app.routes.cache_handler import router as cache_router
+from app.routes.kpis import router as kpis_router
+from app.routes.compute import router as compute_router
+
+# Arrêt de l'application : processus de calcul et connexions à Watsonx
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    compute_pool.shutdown()
+    close_watsonx_client()
 
 # Initialisation de l'application FastAPI
-app = FastAPI(title="Health Data API", version="1.0", description="API for Health data analysis")
+app = FastAPI(title="Health Data API", version="1.0", description="API for Health data analysis", lifespan=lifespan)
 
 # Configuration CORS
 app.add_middleware(
@@ -23,8 +36,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # En-têtes lisibles par le front-end (revalidation et pagination)
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
+# Compression gzip / brotli des réponses volumineuses (négociée avec Accept-Encoding)
+app.add_middleware(CompressionMiddleware)
+
 # Ajout des routes
 app.include_router(heart_router)
 app.include_router(oxygen_router)
@@ -35,6 +53,8 @@ app.include_router(forecast_router)
 app.include_router(scores_router)
 app.include_router(report_router)
 app.include_router(cache_router)
+app.include_router(kpis_router)
+app.include_router(compute_router)
 
 # Endpoint racine
 @app.get("/")
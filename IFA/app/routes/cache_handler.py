@@ -1,74 +1,248 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.services.file_parser import extract_data
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+from app.services.file_parser import extract_data, file_digest
+from app.services.record_store import RecordStore
+from app.services.dataset_cache import DatasetCache, CacheBudgetError
+from app.services.disk_store import DiskStore
+from app.config import DISK_CACHE_DIR
+from app.services.result_cache import result_cache
+from app.services.ingest_jobs import IngestJob, IngestJobManager, IngestError
+from app.services.record_query import RecordQuery, QueryError, decode_cursor
+from app.routes.responses import (
+    json_response, frame_records, ndjson_lines, ndjson_stream, json_array_stream, negotiate_format, MEDIA_TYPES,
+    entity_tag, not_modified, validator_headers,
+)
+from app.routes.columnar import columnar_stream, frame_table, table_bytes
 import xml.etree.ElementTree as ET
-import pandas as pd
-import json
-import numpy as np
+import os
+import shutil
+import tempfile
 
 # Création du router
 router = APIRouter()
 
-# Cache en mémoire
-cache = {}
+# Cache en mémoire, borné (budget en octets, éviction LRU, durée de vie optionnelle) ;
+# les réponses calculées pour un fichier retiré du cache sont invalidées avec lui.
+# Les jeux de données sont aussi persistés sur disque (Arrow IPC) pour survivre aux redémarrages.
+cache = DatasetCache(
+    on_remove=result_cache.invalidate,
+    backend=DiskStore(DISK_CACHE_DIR) if DISK_CACHE_DIR else None,
+)
 
 
-# Fonction pour nettoyer les valeurs non JSON-compatibles
-def clean_data(data):
-    """ Nettoie les NaN, inf et -inf dans un dictionnaire avant conversion JSON. """
-    if isinstance(data, dict):
-        return {k: clean_data(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [clean_data(v) for v in data]
-    elif isinstance(data, float):  # Gérer NaN et valeurs infinies
-        if np.isnan(data) or np.isinf(data):
-            return None
-    return data
+async def load_cached(filename):
+    """Jeu de données en cache d'un fichier, ou None ; une relecture depuis le disque se fait hors de la boucle d'événements."""
+    return await run_in_threadpool(cache.get, filename)
 
 
-@router.post("/upload/")
-async def upload_xml(file: UploadFile = File(...)):
+async def get_record_store(filename):
+    """Récupère les enregistrements typés d'un fichier en cache, ou lève une erreur 404."""
+    store = await load_cached(filename)
+    if store is None:
+        raise not_in_cache(filename)
+    return store
+
+
+def not_in_cache(filename):
+    """Erreur 404 d'un fichier absent du cache."""
+    return HTTPException(status_code=404, detail=f"File '{filename}' not found in cache. Upload the file first.")
+
+
+def load_upload(file, base_filename=None, job=None):
     """
-    Upload an XML file, extract its data, and store it in cache.
+    Construit le jeu de données d'un fichier uploadé, en évitant autant que possible de le reparser.
+
+    - un fichier au contenu identique à un jeu de données déjà en cache (même
+      empreinte) est réutilisé tel quel ;
+    - avec `base_filename` (export précédent du même utilisateur), seuls les
+      enregistrements créés après le plus récent de cet export sont extraits, puis
+      ajoutés à ses données et à son cube d'agrégats ;
+    - sinon, le fichier est entièrement parsé.
+
+    Avec `job` (IngestJob), les octets lus et les enregistrements extraits sont
+    reportés dans la tâche au fil du parsing.
+
+    Retourne le jeu de données et le mode utilisé ("deduplicated", "incremental" ou "full").
     """
+    version = file_digest(file)
+
+    store = cache.get_version(version)
+    if store is not None:
+        return store, "deduplicated"
+
+    progress = None
+    if job is not None:
+        file, progress = job.track(file), job.set_records
+
+    if base_filename:
+        base = cache.get(base_filename)
+        if base is None:
+            raise not_in_cache(base_filename)
+        delta = extract_data(file, since=base.high_water_mark(), progress=progress)
+        return base.extend(delta, version=version), "incremental"
+
+    return RecordStore(extract_data(file, progress=progress), version=version), "full"
+
+
+def ingest_upload(job, path, base_filename=None):
+    """Tâche de fond : parse le fichier uploadé (copie temporaire), le met en cache et retourne le résumé."""
     try:
-        df_records = extract_data(file.file)
+        with open(path, "rb") as file:
+            store, mode = load_upload(file, base_filename, job)
 
         # Vérifier si des données ont été extraites
-        if df_records.empty:
-            raise HTTPException(status_code=400, detail="No valid data found in the XML file.")
+        if store.empty:
+            raise IngestError(400, "No valid data found in the XML file.")
+
+        # Stocker les enregistrements typés en cache (clé = nom du fichier)
+        cache[job.filename] = store
+        job.set_records(len(store))
+
+        return {
+            "message": "File successfully processed and stored in cache",
+            "filename": job.filename,
+            "version": store.version,
+            "mode": mode,
+            "records": len(store)
+        }
 
-        # Stocker les données en cache (clé = nom du fichier)
-        cache[file.filename] = df_records
+    except HTTPException as e:
+        raise IngestError(e.status_code, e.detail)
 
-        return {"message": "File successfully processed and stored in cache", "filename": file.filename}
-    
     except ET.ParseError:
-        raise HTTPException(status_code=400, detail="Invalid XML format. Please upload a valid XML file.")
-    
+        raise IngestError(400, "Invalid XML format. Please upload a valid XML file.")
+
+    except CacheBudgetError as e:
+        raise IngestError(413, str(e))
+
+    finally:
+        os.remove(path)
+
+
+# Pool de workers des ingestions : le parsing ne bloque plus la boucle d'événements
+ingest_jobs = IngestJobManager(ingest_upload)
+
+
+def spool_upload(file):
+    """Copie le fichier uploadé dans un fichier temporaire qui survit à la requête ; retourne son chemin et sa taille."""
+    with tempfile.NamedTemporaryFile(prefix="ifa-upload-", suffix=".xml", delete=False) as spooled:
+        shutil.copyfileobj(file, spooled)
+        return spooled.name, spooled.tell()
+
+
+@router.post("/upload/", status_code=202)
+async def upload_xml(file: UploadFile = File(...), base_filename: Optional[str] = None):
+    """
+    Upload an XML file and schedule its ingestion as a background job.
+
+    The response carries a job id right away; poll `/upload/jobs/{job_id}` for the
+    bytes and records processed, the estimated time remaining and the final result.
+    Identical files are deduplicated by content hash. When `base_filename` names a
+    previous export of the same user, only the newer records are parsed and merged.
+    """
+    try:
+        path, size = await run_in_threadpool(spool_upload, file.file)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+    job = ingest_jobs.submit(IngestJob(file.filename, size), path, base_filename)
+
+    return {
+        "message": "File accepted for processing",
+        "job_id": job.job_id,
+        "filename": file.filename,
+        "status": job.status,
+        "status_url": f"/upload/jobs/{job.job_id}"
+    }
+
+
+@router.get("/upload/jobs/{job_id}")
+async def upload_job_status(job_id: str):
+    """
+    Return the progress of an ingestion job (bytes and records processed, ETA) and its result or error.
+    """
+    status = ingest_jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+
+def page_response(query, cursor, limit, output, headers):
+    """Lit une page d'enregistrements et construit la réponse (JSON avec curseur, ou NDJSON / Arrow / Parquet)."""
+    page, next_cursor = query.page(cursor, limit)
+    if output == "json":
+        return json_response({"data": frame_records(page), "next_cursor": next_cursor}, headers=headers)
+
+    if next_cursor:
+        headers = {**headers, "X-Next-Cursor": next_cursor}
+    if output == "ndjson":
+        content = ndjson_lines(page)
+    else:
+        content = table_bytes(frame_table(page), output)
+    return Response(content=content, media_type=MEDIA_TYPES[output], headers=headers)
+
 
 @router.get("/data/{filename}")
-async def get_data(filename: str):
-    """ Récupère les données depuis le cache et les nettoie avant de renvoyer une réponse JSON. """
-    data = cache.get(filename)
+async def get_data(
+    filename: str,
+    request: Request,
+    type: Optional[List[str]] = Query(None),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    columns: Optional[List[str]] = Query(None),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    format: Optional[str] = None,
+):
+    """
+    Return the cached records of a file (dates in UTC, with the local UTC offset of
+    startDate in minutes as startDateOffset; NaN, inf and missing dates as null).
+
+    - `type` (repeatable) keeps only these HealthKit types; `start` / `end` (UTC when
+      they have no timezone) keep the records whose startDate is in [start, end); `columns` (repeatable) selects the
+      fields returned.
+    - With `limit`, one page is returned as {"data": [...], "next_cursor": ...};
+      pass `next_cursor` back as `cursor` to read the following page.
+    - Without `limit`, every matching record is streamed, chunk by chunk.
+    - `format=ndjson` (or `Accept: application/x-ndjson`) returns one JSON object
+      per line; `format=arrow` (`application/vnd.apache.arrow.stream`) an Arrow IPC
+      stream and `format=parquet` (`application/vnd.apache.parquet`) a Parquet file,
+      both built from the cached columns. The next page cursor of these formats is
+      in the `X-Next-Cursor` header.
+    - The response carries a strong ETag (dataset version and parameters); a request
+      whose `If-None-Match` matches it gets a 304 without reading any record.
+    """
+    data = await load_cached(filename)
     if data is None:
         raise HTTPException(status_code=404, detail="Data not found")
 
-    # Convertir le DataFrame en dictionnaire
-    if isinstance(data, pd.DataFrame):
-        # Convertir d'abord le DataFrame en dictionnaire
-        data_dict = data.to_dict(orient='records')
-        # Puis nettoyer les valeurs non conformes JSON
-        cleaned_data = clean_data(data_dict)
-        
-        # Retourner les données directement (FastAPI s'occupera de la sérialisation JSON)
-        return cleaned_data
-    else:
-        # Si ce n'est pas un DataFrame, nettoyer et renvoyer directement
-        cleaned_data = clean_data(data)
-        return cleaned_data
+    output = negotiate_format(request, format)
+    try:
+        query = RecordQuery(data, types=type, start=start, end=end, columns=columns)
+        after = decode_cursor(cursor, data.version) if cursor else 0
+    except QueryError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    # Réponse déjà détenue par le client : rien à relire ni à sérialiser
+    etag = entity_tag(data.version, "data", type, query.start, query.end, columns, cursor, limit, output)
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    headers = validator_headers(etag)
+
+    # Sans limite : enregistrements convertis et envoyés bloc par bloc (mémoire constante)
+    if limit is None:
+        if output == "ndjson":
+            return ndjson_stream(query.chunks(after), headers=headers)
+        if output in ("arrow", "parquet"):
+            return columnar_stream(query.chunks(after), query.concat([]), output, headers=headers)
+        return json_array_stream(query.chunks(after), headers=headers)
+
+    # Une page, lue et sérialisée hors de la boucle d'événements
+    return await run_in_threadpool(page_response, query, cursor, limit, output, headers)
 
 
 @router.delete("/clear-cache/")
@@ -77,4 +251,31 @@ async def clear_cache():
     Clear all stored data from the cache.
     """
     cache.clear()
-    return {"message": "Cache successfully cleared"}
\ No newline at end of file
+    result_cache.clear()
+    return {"message": "Cache successfully cleared"}
+
+
+@router.delete("/cache/{filename}")
+async def delete_cached_file(filename: str):
+    """
+    Remove a single file from the cache.
+    """
+    if not cache.delete(filename):
+        raise HTTPException(status_code=404, detail="Data not found")
+    return {"message": "File successfully removed from cache", "filename": filename}
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """
+    Return the upload cache statistics (entries, bytes, hit rate, evictions, expirations).
+    """
+    return cache.stats()
+
+
+@router.get("/cache/results/stats")
+async def result_cache_stats():
+    """
+    Return the KPI result cache statistics (entries, bytes, hits, misses, hit rate).
+    """
+    return result_cache.stats()
\ No newline at end of file
@@ -0,0 +1,135 @@
+import orjson
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi.responses import StreamingResponse
+from app.services.disk_store import records_to_table, JSON_COLUMNS_KEY
+
+# Types MIME des formats colonnes
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# Métadonnées du schéma des KPIs : moyennes globales et évolutions de chaque type
+KPI_OVERALL_KEY = b"ifa.overall"
+
+# Granularités des KPIs, dans l'ordre de kpi_payload
+KPI_GRAINS = ["daily", "weekly", "monthly"]
+
+
+class ChunkSink:
+    """
+    Destination d'écriture Arrow / Parquet dont on retire les octets au fur et à mesure.
+
+    La position (tell) reste celle du flux complet : les offsets écrits dans le
+    pied du fichier Parquet sont donc corrects même si le début a déjà été envoyé.
+    """
+
+    def __init__(self):
+        self.closed = False
+        self.position = 0
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        """Retourne les octets écrits depuis le dernier appel."""
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def table_schema(frame):
+    """Schéma Arrow des enregistrements d'un DataFrame (les colonnes imbriquées, stockées en JSON, sont des chaînes)."""
+    schema = records_to_table(frame.iloc[0:0]).schema
+    json_columns = set(orjson.loads(schema.metadata[JSON_COLUMNS_KEY]))
+    fields = [field.with_type(pa.string()) if field.name in json_columns else field for field in schema]
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def frame_table(frame, schema=None):
+    """Convertit un DataFrame en table Arrow colonne par colonne, sans passer par des objets Python par ligne."""
+    table = records_to_table(frame)
+    return table.cast(schema or table_schema(frame))
+
+
+def open_writer(sink, schema, output):
+    """Ouvre un writer Arrow IPC (flux) ou Parquet sur une destination."""
+    if output == "parquet":
+        return pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    return pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+
+
+def table_bytes(table, output):
+    """Écrit une table complète au format Arrow IPC (flux) ou Parquet."""
+    sink = ChunkSink()
+    with open_writer(sink, table.schema, output) as writer:
+        writer.write_table(table)
+    return sink.take()
+
+
+def columnar_stream(chunks, empty_frame, output, headers=None):
+    """
+    Réponse Arrow IPC (flux) ou Parquet envoyée bloc par bloc, à partir de couples
+    (DataFrame, position) produits à la demande : un lot Arrow (ou un groupe de
+    lignes Parquet) par bloc. `empty_frame` donne les colonnes et leurs types.
+    """
+    schema = table_schema(empty_frame)
+
+    def body():
+        sink = ChunkSink()
+        with open_writer(sink, schema, output) as writer:
+            for chunk, _ in chunks:
+                if len(chunk):
+                    writer.write_table(frame_table(chunk, schema))
+                    yield sink.take()
+        yield sink.take()
+
+    media_type = PARQUET_MEDIA_TYPE if output == "parquet" else ARROW_MEDIA_TYPE
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
+
+
+def kpi_table(kpis):
+    """
+    Met les KPIs de plusieurs types ({type: (daily, weekly, monthly, overall, évolution, série)})
+    sous forme d'une table longue : type, granularité ("series" pour la série demandée),
+    période, moyenne et évolution (journalière uniquement). Les moyennes globales sont
+    dans les métadonnées du schéma.
+    """
+    frames = []
+    overall = {}
+    for identifier, (daily_avg, weekly_avg, monthly_avg, overall_avg, overall_avg_ev, series) in kpis.items():
+        grains = zip(KPI_GRAINS + ["series"], (daily_avg, weekly_avg, monthly_avg, series))
+        for grain, frame in grains:
+            if frame is None:
+                continue
+            frames.append(pd.DataFrame({
+                "type": identifier,
+                "grain": grain,
+                "period": frame.iloc[:, 0].astype(str).to_numpy(),
+                "avg": frame.iloc[:, 1].to_numpy(dtype="float64"),
+                "evolution": frame["evolution"].to_numpy(dtype="float64") if "evolution" in frame else float("nan"),
+            }))
+        overall[identifier] = {"overall_avg": overall_avg, "overall_avg_ev": overall_avg_ev}
+
+    schema = pa.schema([
+        ("type", pa.string()),
+        ("grain", pa.string()),
+        ("period", pa.string()),
+        ("avg", pa.float64()),
+        ("evolution", pa.float64()),
+    ], metadata={KPI_OVERALL_KEY: orjson.dumps(overall, option=orjson.OPT_SERIALIZE_NUMPY)})
+
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=schema.names)
+    return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
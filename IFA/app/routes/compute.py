@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from app.services.compute_pool import compute_pool
+from app.services.single_flight import single_flight
+
+router = APIRouter(prefix="/compute", tags=["Compute Pool"])
+
+@router.get("/stats")
+async def compute_stats():
+    """
+    Return the compute pool configuration and per-queue metrics (in flight, rejected, timed out, wait and run times),
+    and how many concurrent identical requests were coalesced into a single computation.
+    """
+    return {**compute_pool.stats(), "single_flight": single_flight.stats()}
@@ -1,68 +1,130 @@
-from fastapi import APIRouter, HTTPException
-import pandas as pd
-import json
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from app.services.timeseries_forecasting import (
     process_heart_data,
     prepare_forecasting_data,
     forecast_heart_rate
 )
-from app.routes.cache_handler import cache
+from app.routes.cache_handler import get_record_store, load_cached, cache
+from app.services.forecast_cache import forecast_cache
+from app.services.watsonx_client import WatsonxError
+from app.services.forecast_engines import ENGINES
+from app.services.batch_forecast import run_batch_forecast, BATCH_METRICS
+from app.services.backtesting import run_backtest
+from app.config import FORECAST_ENGINE, BACKTEST_STEP_HOURS, BACKTEST_MAX_ORIGINS
+from app.routes.responses import run_compute, render, serialize
 
 router = APIRouter(prefix="/timeseries", tags=["Time Series Forecasting"])
 
-def format_response(data):
-    """Convertit les données en format JSON."""
-    return json.loads(json.dumps(data, default=str))
-
-@router.post("/forecast/")
-async def upload_and_forecast_heart_data(filename: str):
-    """Upload du fichier XML et exécution du forecasting sur la fréquence cardiaque."""
-
-    # Récupérer les données depuis le cache
-    cached_data = cache.get(filename)
-    if cached_data is None:
-        raise HTTPException(status_code=404, detail=f"File '{filename}' not found in cache. Upload the file first.")
-    
-    # Convertir les données en DataFrame si nécessaire
-    if isinstance(cached_data, pd.DataFrame):
-        df_records = cached_data
-    elif isinstance(cached_data, dict) or isinstance(cached_data, list):
-        try:
-            # Si c'est une liste de dictionnaires (format le plus courant)
-            if isinstance(cached_data, list) and all(isinstance(item, dict) for item in cached_data):
-                df_records = pd.DataFrame(cached_data)
-            # Si c'est un dictionnaire de format {colonne: [valeurs]}
-            elif isinstance(cached_data, dict) and all(isinstance(cached_data[k], list) for k in cached_data):
-                df_records = pd.DataFrame(cached_data)
-            # Autres formats possibles de dictionnaire
-            else:
-                # Tenter une conversion générique
-                df_records = pd.DataFrame.from_dict(cached_data, orient='records' if isinstance(cached_data, list) else 'columns')
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Failed to convert cached data to DataFrame: {str(e)}"
-            )
-    else:
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Cached data is not in a format that can be converted to DataFrame. Type: {type(cached_data)}"
-        )    
-    
-
-    
-    df_heart_rate_minute = process_heart_data(df_records)
+def forecast_response(store, engine=FORECAST_ENGINE):
+    """Prépare la série minute par minute et exécute le forecasting (dans le pool de calcul)."""
+    df_heart_rate_minute = process_heart_data(store)
     df_prepared = prepare_forecasting_data(df_heart_rate_minute)
     
     # Exécuter le forecasting
-    results, mape = forecast_heart_rate(df_prepared)
+    results, mape = forecast_heart_rate(df_prepared, engine)
     
-    reponse = {
+    return {
         "status": "success",
+        "engine": engine,
         "mape": mape,
         "forecast": results
     }
-    
-    response = format_response(reponse)  
 
-    return response 
+@router.post("/forecast/")
+async def upload_and_forecast_heart_data(filename: str, engine: Optional[str] = None):
+    """
+    Upload du fichier XML et exécution du forecasting sur la fréquence cardiaque.
+
+    `engine` choisit le moteur : "watsonx" (Granite TTM distant), "ridge" ou
+    "seasonal_naive" (locaux, sans appel réseau) ; par défaut celui de la configuration.
+    """
+    engine = forecast_engine(engine)
+
+    # Récupérer les enregistrements typés depuis le cache
+    store = await get_record_store(filename)
+
+    # Forecasting exécuté (et réponse sérialisée) hors de la boucle d'événements
+    try:
+        payload = await run_compute("forecast", filename, store, render, forecast_response, {"engine": engine})
+    except WatsonxError as e:
+        raise HTTPException(status_code=502, detail=f"Forecasting service unavailable: {e.detail}")
+
+    return Response(content=payload, media_type="application/json")
+
+
+def requested_files(filenames):
+    """Fichiers demandés (sans doublons), tous les fichiers en cache par défaut."""
+    return list(dict.fromkeys(filenames or cache.filenames()))
+
+
+def forecast_engine(engine):
+    """Moteur demandé (par défaut celui de la configuration) ; erreur 400 s'il n'existe pas."""
+    engine = engine or FORECAST_ENGINE
+    if engine not in ENGINES:
+        raise HTTPException(status_code=400, detail=f"Unsupported engine '{engine}'. Use one of: {', '.join(ENGINES)}.")
+    return engine
+
+
+@router.post("/forecast/batch/")
+async def batch_forecast(
+    filenames: Optional[List[str]] = Query(None),
+    types: Optional[List[str]] = Query(None),
+    engine: Optional[str] = None,
+):
+    """
+    Forecast several metrics for many cached files in one call.
+
+    - `filenames` (repeatable) defaults to every cached file; `types` (repeatable)
+      defaults to heart rate, SpO2, respiratory rate and HRV.
+    - Series are prepared and sent to the engine in multi-series batches, a few
+      batches at a time; results are streamed as NDJSON (one line per file and
+      type) as soon as their batch completes, in completion order.
+    - Each batch loads its datasets when it starts and releases them when it
+      completes; a file missing from the cache gets a `not_found` line.
+    """
+    engine = forecast_engine(engine)
+    filenames = requested_files(filenames)
+
+    async def body():
+        async for rows in run_batch_forecast(filenames, load_cached, types or BATCH_METRICS, engine):
+            yield b"".join(serialize(row) + b"\n" for row in rows)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@router.post("/backtest/")
+async def backtest(
+    filenames: Optional[List[str]] = Query(None),
+    types: Optional[List[str]] = Query(None),
+    engines: Optional[List[str]] = Query(None),
+    step: int = Query(BACKTEST_STEP_HOURS, ge=1),
+    max_origins: int = Query(BACKTEST_MAX_ORIGINS, ge=1, le=1000),
+):
+    """
+    Rolling-origin backtest of the forecasting engines.
+
+    - Each series is forecast from up to `max_origins` origins, `step` hours apart,
+      going back from the production window (last 96 hours).
+    - `engines` (repeatable) defaults to every engine; each (file, engine) pair runs
+      in the compute pool.
+    - Results are streamed as NDJSON: one line per file, type and engine with the
+      MAPE / MAE distribution over windows for each horizon, call latency and
+      throughput, then a final summary line aggregating all files. A file missing
+      from the cache gets a `not_found` line.
+    """
+    engines = [forecast_engine(engine) for engine in dict.fromkeys(engines or ENGINES)]
+    filenames = requested_files(filenames)
+
+    async def body():
+        async for rows in run_backtest(filenames, load_cached, types or BATCH_METRICS, engines, step, max_origins):
+            yield b"".join(serialize(row) + b"\n" for row in rows)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@router.get("/forecast/cache/stats")
+async def forecast_cache_stats():
+    """Statistiques du cache persistant des prévisions (entrées, taille, durée de vie et nombre maximal d'entrées)."""
+    return forecast_cache.stats()
@@ -0,0 +1,32 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query, Request
+from app.utils import compute_kpis_batch
+from app.routes.cache_handler import get_record_store
+from app.routes.responses import cached_response, negotiate_format, kpi_window, kpi_sampling, KPI_FORMATS
+
+router = APIRouter(prefix="/kpis", tags=["Batch KPIs"])
+
+# Métriques affichées par le tableau de bord
+DEFAULT_TYPES = [
+    "HKQuantityTypeIdentifierHeartRate",
+    "HKQuantityTypeIdentifierHeartRateVariabilitySDNN",
+    "HKQuantityTypeIdentifierOxygenSaturation",
+    "HKQuantityTypeIdentifierVO2Max",
+    "HKQuantityTypeIdentifierActiveEnergyBurned",
+    "HKQuantityTypeIdentifierRespiratoryRate",
+]
+
+@router.api_route("/batch/", methods=["GET", "POST"])
+async def batch_kpis(filename: str, request: Request, types: Optional[List[str]] = Query(None), format: Optional[str] = None, interval: dict = Depends(kpi_window), sampling: dict = Depends(kpi_sampling)):
+    """Calcule en une seule requête les KPIs de plusieurs types de données (par défaut, ceux du tableau de bord)."""
+
+    # Récupérer les enregistrements typés depuis le cache
+    store = await get_record_store(filename)
+
+    types = types or DEFAULT_TYPES
+
+    # Format de réponse : JSON par défaut, Arrow IPC ou Parquet (une table longue pour tous les types)
+    output = negotiate_format(request, format, KPI_FORMATS)
+
+    # Réponse servie depuis le cache de résultats si elle a déjà été calculée
+    return await cached_response(filename, store, "batch", compute_kpis_batch, {"identifiers": tuple(types), **interval}, output=output, sampling=sampling, request=request)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from app.services.medical_agent import generate_medical_report
-import json
+from app.routes.responses import json_response
 
 router = APIRouter(prefix="/medical", tags=["Medical Report"])
 
@@ -18,6 +18,8 @@ async def generate_report(patient_data: dict):
                 "medical_report": report
             }
         }
-        return json.loads(json.dumps(response, default=str))
+        return json_response(response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating medical report: {str(e)}")
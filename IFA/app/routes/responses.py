@@ -0,0 +1,346 @@
+from datetime import datetime
+import hashlib
+from typing import Optional
+from fastapi import Query, Response, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import numpy as np
+import orjson
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+from app.services.result_cache import result_cache
+from app.services.compute_pool import compute_pool, ComputeSaturatedError, DatasetUnavailableError
+from app.services.single_flight import single_flight
+from app.services.record_query import local_timestamp
+from app.services.record_store import is_json_column
+from app.services.downsampling import downsample_frame, DOWNSAMPLE_METHODS
+from app.compression import negotiate_encoding, compressible, compress, encoded_etag, decoded_etag
+from app.config import COMPRESSION_MIN_BYTES
+from app.routes.columnar import ARROW_MEDIA_TYPE, PARQUET_MEDIA_TYPE, kpi_table, table_bytes
+
+
+# Scalaires et tableaux NumPy sérialisés nativement par orjson
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# Formats de réponse (paramètre `format` ou en-tête Accept) et types MIME correspondants
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "arrow": ARROW_MEDIA_TYPE,
+    "parquet": PARQUET_MEDIA_TYPE,
+}
+
+# Formats proposés par les routes de KPIs
+KPI_FORMATS = ("json", "arrow", "parquet")
+
+
+def negotiate_format(request, format=None, formats=tuple(MEDIA_TYPES)):
+    """Format demandé par le paramètre `format`, sinon par l'en-tête Accept ; JSON par défaut."""
+    if format is not None:
+        if format not in formats:
+            raise HTTPException(status_code=400, detail=f"Unsupported format '{format}'. Use one of: {', '.join(formats)}.")
+        return format
+
+    accept = request.headers.get("accept", "")
+    for name in formats:
+        if name != "json" and MEDIA_TYPES[name] in accept:
+            return name
+    return "json"
+
+
+def entity_tag(version, *parts, weak=False):
+    """
+    ETag d'une réponse : empreinte de la version du jeu de données (empreinte de
+    son contenu) et des paramètres qui déterminent la réponse.
+
+    L'ETag est fort (même corps octet pour octet) sauf avec `weak` : pour une réponse
+    dont le corps peut changer d'un calcul à l'autre sur les mêmes données (analyse
+    par un LLM, horodatage), il ne garantit que l'équivalence sémantique (W/).
+    """
+    digest = hashlib.sha256(repr((version, parts)).encode()).hexdigest()
+    return f'{"W/" if weak else ""}"{digest[:32]}"'
+
+
+def validator_headers(etag):
+    """En-têtes de revalidation : le client garde la réponse mais la revalide à chaque affichage."""
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def not_modified(request, etag):
+    """
+    Réponse 304 si l'ETag est l'une des valeurs de l'en-tête If-None-Match de la requête, sinon None.
+
+    La réponse 304 reprend l'ETag de la représentation détenue par le client
+    (suffixé par son encodage, comme dans la réponse 200 compressée).
+    """
+    header = request.headers.get("if-none-match") if request is not None else None
+    if not header:
+        return None
+
+    # Comparaison faible (RFC 9110) : W/"x" correspond à "x", quel que soit l'encodage de la réponse détenue
+    weak = "W/" if etag.startswith("W/") else ""
+    for tag in (tag.strip().removeprefix("W/") for tag in header.split(",")):
+        if tag == "*" or decoded_etag(tag) == etag.removeprefix("W/"):
+            held = etag if tag == "*" else weak + tag
+            return Response(status_code=304, headers={**validator_headers(held), "Vary": "Accept-Encoding"})
+    return None
+
+
+def encode_default(obj):
+    """Types non gérés nativement par orjson : dates pandas, tableaux non contigus, sinon leur représentation texte."""
+    if obj is pd.NaT:
+        return None
+    if isinstance(obj, pd.Timestamp):
+        return obj.to_pydatetime()
+    if isinstance(obj, (np.ndarray, pd.Series, pd.Index)):
+        return obj.tolist()
+    return str(obj)
+
+
+def serialize(data):
+    """
+    Sérialise une réponse en JSON (UTF-8, compact) avec orjson.
+
+    NaN et ±inf deviennent null, les dates sont au format ISO 8601 et les valeurs
+    NumPy sont écrites directement, sans conversion préalable en objets Python.
+    """
+    return orjson.dumps(data, default=encode_default, option=ORJSON_OPTIONS)
+
+
+def column_values(series):
+    """
+    Valeurs d'une colonne prêtes pour orjson (dates manquantes remplacées par None).
+    Le texte JSON des colonnes imbriquées (MetadataEntry...) est inséré tel quel, sans être décodé.
+    """
+    if is_json_column(series):
+        return [None if text is None else orjson.Fragment(text) for text in series.to_numpy(dtype=object, na_value=None)]
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.to_numpy(dtype="datetime64[us]")
+        mask = np.isnat(values)
+        if mask.any():
+            values = values.astype(object)
+            values[mask] = None
+        return values
+    return series.to_numpy()
+
+
+def frame_records(frame):
+    """
+    Convertit un DataFrame en liste d'enregistrements (comme to_dict(orient="records")).
+
+    Les colonnes sont converties une seule fois en tableaux NumPy et les lignes
+    assemblées par zip : aucune valeur n'est convertie cellule par cellule.
+    """
+    columns = [str(column) for column in frame.columns]
+    values = [column_values(frame[column]) for column in frame.columns]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def json_response(data, status_code=200, headers=None):
+    """Réponse JSON sérialisée par orjson."""
+    return Response(content=serialize(data), status_code=status_code, media_type="application/json", headers=headers)
+
+
+def records_response(frame):
+    """Réponse JSON listant les lignes d'un DataFrame."""
+    return json_response(frame_records(frame))
+
+
+def ndjson_lines(frame):
+    """Lignes d'un DataFrame au format NDJSON (un objet JSON par ligne)."""
+    option = ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE
+    return b"".join(orjson.dumps(row, default=encode_default, option=option) for row in frame_records(frame))
+
+
+def ndjson_stream(chunks, headers=None):
+    """Réponse NDJSON envoyée bloc par bloc, à partir de couples (DataFrame, position) produits à la demande."""
+    def body():
+        for chunk, _ in chunks:
+            if len(chunk):
+                yield ndjson_lines(chunk)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers=headers)
+
+
+def json_array_stream(chunks, headers=None):
+    """Réponse JSON (un tableau d'enregistrements) envoyée bloc par bloc, sans construire le tableau complet."""
+    def body():
+        separator = b"["
+        for chunk, _ in chunks:
+            if len(chunk):
+                # Contenu du tableau sérialisé pour ce bloc, sans ses crochets
+                yield separator + serialize(frame_records(chunk))[1:-1]
+                separator = b","
+        yield b"[]" if separator == b"[" else b"]"
+
+    return StreamingResponse(body(), media_type="application/json", headers=headers)
+
+
+def kpi_payload(daily_avg, weekly_avg, monthly_avg, overall_avg, overall_avg_ev, series=None):
+    """Met en forme les KPIs d'une métrique (moyennes par période, métriques globales et série demandée)."""
+    payload = {
+        "daily_avg": frame_records(daily_avg),
+        "weekly_avg": frame_records(weekly_avg),
+        "monthly_avg": frame_records(monthly_avg),
+        "overall_avg": overall_avg,
+        "overall_avg_ev": overall_avg_ev
+    }
+    if series is not None:
+        payload["series"] = frame_records(series)
+    return payload
+
+
+# Granularités des séries de KPIs ("custom" : fenêtre de durée fixe donnée par `window`)
+KPI_GRANULARITIES = ("hour", "day", "week", "month", "custom")
+
+
+def kpi_window(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: Optional[str] = None,
+    window: Optional[str] = None,
+):
+    """
+    Paramètres communs des routes de KPIs : intervalle [start, end) (heure locale des
+    enregistrements ; le fuseau d'une borne est ignoré) et granularité
+    de la série renvoyée en plus des moyennes (`window` = "15min", "6h", "3D"... pour
+    une granularité "custom"). Retourne les arguments des fonctions de KPIs.
+    """
+    params = {}
+    start, end = local_timestamp(start), local_timestamp(end)
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="'start' must be before 'end'.")
+    if start is not None:
+        params["start"] = start
+    if end is not None:
+        params["end"] = end
+
+    if granularity is not None:
+        if granularity not in KPI_GRANULARITIES:
+            raise HTTPException(status_code=400, detail=f"Unsupported granularity '{granularity}'. Use one of: {', '.join(KPI_GRANULARITIES)}.")
+
+        if granularity == "custom":
+            # Fenêtre de durée fixe uniquement (pas de mois ni d'année, de durée variable)
+            try:
+                delta = pd.to_timedelta(window) if window else pd.NaT
+            except ValueError:
+                delta = pd.NaT
+            if pd.isna(delta) or delta <= pd.Timedelta(0):
+                raise HTTPException(status_code=400, detail="A custom granularity needs a fixed positive 'window', e.g. '15min', '6h' or '3D'.")
+            granularity = to_offset(delta).freqstr
+        params["granularity"] = granularity
+
+    return params
+
+
+def kpi_sampling(
+    max_points: Optional[int] = Query(None, ge=4),
+    downsample: str = "lttb",
+):
+    """
+    Sous-échantillonnage des séries de KPIs : au plus `max_points` points par série,
+    choisis par LTTB (allure de la courbe) ou enveloppe "minmax" (extrêmes de chaque tranche).
+    """
+    if downsample not in DOWNSAMPLE_METHODS:
+        raise HTTPException(status_code=400, detail=f"Unsupported downsampling '{downsample}'. Use one of: {', '.join(DOWNSAMPLE_METHODS)}.")
+    if max_points is None:
+        return {}
+    return {"max_points": max_points, "method": downsample}
+
+
+def downsample_kpis(kpis, max_points, method):
+    """Réduit chaque série de KPIs (moyennes par période et série demandée) à au plus `max_points` points."""
+    if isinstance(kpis, dict):
+        return {identifier: downsample_kpis(metrics, max_points, method) for identifier, metrics in kpis.items()}
+
+    daily_avg, weekly_avg, monthly_avg, overall_avg, overall_avg_ev, series = kpis
+    daily_avg, weekly_avg, monthly_avg, series = (
+        downsample_frame(frame, max_points, method) for frame in (daily_avg, weekly_avg, monthly_avg, series)
+    )
+    return daily_avg, weekly_avg, monthly_avg, overall_avg, overall_avg_ev, series
+
+
+def kpi_body(kpis):
+    """Corps JSON d'une route de KPIs : une métrique (tuple de KPIs) ou plusieurs ({type: tuple})."""
+    if isinstance(kpis, dict):
+        return {"status": "success", "data": {identifier: kpi_payload(*metrics) for identifier, metrics in kpis.items()}}
+    return {"status": "success", "data": kpi_payload(*kpis)}
+
+
+def render(store, compute, params):
+    """Calcule puis sérialise une réponse (exécutée dans le pool de calcul)."""
+    return serialize(compute(store, **params))
+
+
+def render_kpis(store, compute, params, metric, output, sampling=None):
+    """
+    Calcule les KPIs, les sous-échantillonne si demandé (les métriques globales restent
+    calculées sur les séries complètes), puis les sérialise en JSON, Arrow IPC ou
+    Parquet (exécutée dans le pool de calcul).
+    """
+    kpis = compute(store, **params)
+    if sampling:
+        kpis = downsample_kpis(kpis, **sampling)
+    if output == "json":
+        return serialize(kpi_body(kpis))
+    return table_bytes(kpi_table(kpis if isinstance(kpis, dict) else {metric: kpis}), output)
+
+
+async def run_compute(queue, filename, store, fn, *args, key=None):
+    """
+    Exécute `fn(store, *args)` dans le pool de calcul partagé, hors de la boucle d'événements.
+
+    Les requêtes simultanées de même clé (par défaut : file, fichier, version des
+    données, fonction et arguments) partagent un seul calcul. Une file saturée est
+    signalée par une erreur 429 ou 503 (avec Retry-After).
+    """
+    if key is None:
+        key = (queue, filename, store.version, fn.__module__, fn.__qualname__, repr(args))
+    try:
+        return await single_flight.do(key, compute_pool.run_on_dataset, queue, store, fn, *args)
+    except ComputeSaturatedError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+    except DatasetUnavailableError:
+        raise HTTPException(status_code=404, detail=f"File '{filename}' not found in cache. Upload the file first.")
+
+
+async def cached_response(filename, store, metric, compute, params=None, queue="kpi", output="json", sampling=None, request=None):
+    """
+    Retourne la réponse d'une route de KPIs (JSON, Arrow IPC ou Parquet) depuis le cache de résultats.
+
+    `compute(store, **params)` retourne les KPIs d'une métrique (daily, weekly,
+    monthly, overall, évolution) ou de plusieurs ({type: KPIs}). Elle n'est appelée
+    (dans le pool de calcul, puis sa réponse sérialisée et mise en cache) que si
+    aucune réponse n'existe encore pour ce fichier, cette version des données, cette
+    métrique, ces paramètres, ce sous-échantillonnage et ce format. Elle doit être définie au niveau d'un
+    module pour pouvoir être envoyée à un processus.
+
+    La réponse porte un ETag (version des données, métrique et paramètres) : si la
+    `request` le présente dans If-None-Match, une réponse 304 est renvoyée sans calcul.
+    Si elle accepte gzip ou brotli, la réponse compressée est gardée dans le cache à
+    côté de la réponse brute : elle n'est compressée qu'une fois.
+    """
+    params = params or {}
+    sampling = sampling or {}
+    key = result_cache.make_key(filename, store.version, metric, {**params, **sampling, "format": output})
+    etag = entity_tag(store.version, *key[2:])
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+
+    payload = result_cache.get(key)
+    if payload is None:
+        payload = await run_compute(queue, filename, store, render_kpis, compute, params, metric, output, sampling, key=key)
+        result_cache.put(key, payload)
+
+    media_type = MEDIA_TYPES[output]
+    encoding = negotiate_encoding(request.headers.get("accept-encoding")) if request is not None else None
+    if encoding is None or len(payload) < COMPRESSION_MIN_BYTES or not compressible(media_type):
+        return Response(content=payload, media_type=media_type, headers={**validator_headers(etag), "Vary": "Accept-Encoding"})
+
+    body = result_cache.get_encoded(key, encoding)
+    if body is None:
+        body = result_cache.put_encoded(key, encoding, await run_in_threadpool(compress, payload, encoding))
+
+    headers = {**validator_headers(encoded_etag(etag, encoding)), "Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -1,52 +1,30 @@
-from fastapi import APIRouter, HTTPException
-import json
-import pandas as pd
+from fastapi import APIRouter, HTTPException, Request
 from app.services.score_agent import analyze_health_data
 # Importer le cache depuis le module cache_handler
-from app.routes.cache_handler import cache
+from app.routes.cache_handler import get_record_store
+from app.routes.responses import run_compute, json_response, entity_tag, not_modified, validator_headers
 
 router = APIRouter(prefix="/ai", tags=["AI Agent"])
 
 @router.get("/scores/{filename}")
-async def analyze_health(filename: str):
+async def analyze_health(filename: str, request: Request):
     """Analyse les données stockées en cache et retourne les scores des métriques santé."""
     try:
-        # Récupérer les données depuis le cache
-        cached_data = cache.get(filename)
-        if cached_data is None:
-            raise HTTPException(status_code=404, detail=f"File '{filename}' not found in cache. Upload the file first.")
+        # Récupérer les enregistrements typés depuis le cache
+        store = await get_record_store(filename)
         
-        # Convertir les données en DataFrame si nécessaire
-        if isinstance(cached_data, pd.DataFrame):
-            df_records = cached_data
-        elif isinstance(cached_data, dict) or isinstance(cached_data, list):
-            try:
-                # Si c'est une liste de dictionnaires (format le plus courant)
-                if isinstance(cached_data, list) and all(isinstance(item, dict) for item in cached_data):
-                    df_records = pd.DataFrame(cached_data)
-                # Si c'est un dictionnaire de format {colonne: [valeurs]}
-                elif isinstance(cached_data, dict) and all(isinstance(cached_data[k], list) for k in cached_data):
-                    df_records = pd.DataFrame(cached_data)
-                # Autres formats possibles de dictionnaire
-                else:
-                    # Tenter une conversion générique
-                    df_records = pd.DataFrame.from_dict(cached_data, orient='records' if isinstance(cached_data, list) else 'columns')
-            except Exception as e:
-                raise HTTPException(
-                    status_code=500, 
-                    detail=f"Failed to convert cached data to DataFrame: {str(e)}"
-                )
-        else:
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Cached data is not in a format that can be converted to DataFrame. Type: {type(cached_data)}"
-            )
-        
-        if df_records.empty:
+        if store.empty:
             raise HTTPException(status_code=400, detail="Données vides ou invalides.")
+
+        # Scores déjà détenus par le client pour cette version des données : pas de nouvelle analyse.
+        # ETag faible : une nouvelle analyse des mêmes données ne produit pas le même texte ni le même horodatage
+        etag = entity_tag(store.version, "scores", weak=True)
+        unchanged = not_modified(request, etag)
+        if unchanged is not None:
+            return unchanged
         
-        # Analyser les données
-        scores = analyze_health_data(df_records)
+        # Analyser les données (hors de la boucle d'événements)
+        scores = await run_compute("scores", filename, store, analyze_health_data)
         
         response = {
             "status": "success",
@@ -61,7 +39,10 @@ async def analyze_health(filename: str):
         }
         
         # Retourner la réponse
-        return json.loads(json.dumps(response, default=str))
+        return json_response(response, headers=validator_headers(etag))
+
+    except HTTPException:
+        raise
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse des données : {str(e)}")
\ No newline at end of file
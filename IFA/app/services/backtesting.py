@@ -0,0 +1,249 @@
+import asyncio
+import time
+import numpy as np
+from app.config import (
+    BACKTEST_STEP_HOURS,
+    BACKTEST_MAX_ORIGINS,
+    BACKTEST_HORIZONS,
+    BACKTEST_BATCH_WINDOWS,
+    BACKTEST_CONCURRENCY,
+)
+from app.services.compute_pool import compute_pool, percentiles
+from app.services.forecast_engines import ENGINES, get_engine
+from app.services.timeseries_forecasting import (
+    prepare_series_batch,
+    bound_forecast,
+    PHYSICAL_RANGES,
+    TIMESTAMP_COLUMN,
+    TARGET_COLUMN,
+    CONTEXT_LENGTH,
+    FORECAST_HORIZON,
+    FORECAST_FREQ,
+)
+from app.services.batch_forecast import BATCH_METRICS, MIN_SERIES_POINTS, series_row, not_found_row, task_error_detail
+from app.services.watsonx_client import WatsonxError
+
+# Plus petite valeur réelle au dénominateur du MAPE, comme sklearn.metrics.mean_absolute_percentage_error
+MAPE_EPSILON = np.finfo(np.float64).eps
+
+
+def rolling_origins(length, context_length=CONTEXT_LENGTH, horizon=FORECAST_HORIZON, step=BACKTEST_STEP_HOURS,
+                    max_origins=BACKTEST_MAX_ORIGINS):
+    """
+    Origines d'une série de `length` points (indice du premier point prévu), en ordre croissant.
+
+    La plus récente laisse exactement un horizon de valeurs réelles (la fenêtre du
+    forecasting de production), les précédentes reculent de `step` points tant
+    qu'il reste un contexte complet, `max_origins` au plus. Une série plus courte
+    que contexte + horizon n'a que la fenêtre de production.
+    """
+    last = length - horizon
+    origins = range(last, min(context_length, last) - 1, -step)[:max_origins]
+    return list(reversed(origins))
+
+
+def window_errors(actual, predicted):
+    """Erreurs absolues et erreurs absolues en pourcentage de chaque pas prévu (fenêtres × horizon)."""
+    absolute = np.abs(actual - predicted)
+    return absolute, absolute / np.maximum(np.abs(actual), MAPE_EPSILON) * 100
+
+
+def backtest_series(df, ts_engine, horizons=BACKTEST_HORIZONS, step=BACKTEST_STEP_HOURS, max_origins=BACKTEST_MAX_ORIGINS,
+                    batch_windows=BACKTEST_BATCH_WINDOWS, bounds=None):
+    """
+    Évalue un moteur sur une série préparée (date, target) à chaque origine glissante.
+
+    Chaque fenêtre prévoit FORECAST_HORIZON pas à partir des CONTEXT_LENGTH points
+    (au plus) qui précèdent son origine, comme le forecasting de production. Les
+    fenêtres sont envoyées au moteur par paquets de `batch_windows` (un appel
+    multi-séries chacun) sans passer par le cache des prévisions, pour mesurer le
+    moteur lui-même. Les valeurs prévues sont ramenées dans l'intervalle physique
+    `bounds`, comme en production. Retourne, pour chaque horizon h, le MAPE et le
+    MAE de chaque fenêtre sur ses h premiers pas, ainsi que la durée de chaque
+    appel au moteur.
+    """
+    origins = rolling_origins(len(df), CONTEXT_LENGTH, FORECAST_HORIZON, step, max_origins)
+    target = df[TARGET_COLUMN].to_numpy(dtype="float64")
+
+    predicted = []
+    call_seconds = []
+    for start in range(0, len(origins), batch_windows):
+        contexts = [df.iloc[max(origin - CONTEXT_LENGTH, 0):origin] for origin in origins[start:start + batch_windows]]
+        started = time.perf_counter()
+        results = ts_engine.predict_many(contexts, TIMESTAMP_COLUMN, TARGET_COLUMN, FORECAST_FREQ, FORECAST_HORIZON)
+        call_seconds.append(time.perf_counter() - started)
+        predicted.extend(bound_forecast(result[TARGET_COLUMN], bounds)[:FORECAST_HORIZON] for result in results)
+
+    actual = np.stack([target[origin:origin + FORECAST_HORIZON] for origin in origins])
+    absolute, percentage = window_errors(actual, np.stack(predicted))
+
+    return {
+        "windows": len(origins),
+        "origins": {"first": df[TIMESTAMP_COLUMN].iloc[origins[0]], "last": df[TIMESTAMP_COLUMN].iloc[origins[-1]]},
+        "horizons": {
+            h: {"mape": percentage[:, :h].mean(axis=1).tolist(), "mae": absolute[:, :h].mean(axis=1).tolist()}
+            for h in horizons if 0 < h <= FORECAST_HORIZON
+        },
+        "call_seconds": call_seconds,
+    }
+
+
+def backtest_file(store, filename, identifiers, engine, step, max_origins):
+    """
+    Backtest d'un moteur sur les séries d'un fichier (exécutée dans le pool de calcul).
+
+    Retourne une ligne par type : erreurs par fenêtre et par horizon, données
+    insuffisantes ou erreur du moteur.
+    """
+    ts_engine = get_engine(engine)
+    prepared = prepare_series_batch(store, identifiers)
+
+    rows = []
+    for identifier in identifiers:
+        df = prepared.get(identifier)
+        points = 0 if df is None else len(df)
+        if points < MIN_SERIES_POINTS:
+            rows.append(series_row(filename, identifier, "insufficient_data", engine=engine, points=points))
+            continue
+        try:
+            result = backtest_series(df, ts_engine, step=step, max_origins=max_origins, bounds=PHYSICAL_RANGES.get(identifier))
+        except (WatsonxError, ValueError) as e:
+            rows.append(series_row(filename, identifier, "error", engine=engine, detail=str(e)))
+        else:
+            rows.append(series_row(filename, identifier, "success", engine=engine, **result))
+    return rows
+
+
+def distribution(values):
+    """Résume une distribution d'erreurs : moyenne, écart-type, minimum, p10, p50, p90 et maximum."""
+    if not len(values):
+        return None
+
+    values = np.asarray(values, dtype="float64")
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "min": float(values.min()),
+        "p10": float(p10),
+        "p50": float(p50),
+        "p90": float(p90),
+        "max": float(values.max()),
+    }
+
+
+def horizon_distributions(horizons):
+    """Distributions du MAPE et du MAE des fenêtres, pour chaque horizon ({h: {"mape": [...], "mae": [...]}})."""
+    return {
+        str(h): {"mape": distribution(errors["mape"]), "mae": distribution(errors["mae"])}
+        for h, errors in horizons.items()
+    }
+
+
+def summarize_row(row):
+    """Ligne de résultat publiée : distributions par horizon, latence des appels et débit du moteur."""
+    if row["status"] != "success":
+        return row
+
+    row = dict(row)
+    call_seconds = row.pop("call_seconds")
+    row["by_horizon"] = horizon_distributions(row.pop("horizons"))
+    row["latency_ms"] = percentiles(call_seconds)
+    row["windows_per_second"] = row["windows"] / sum(call_seconds) if sum(call_seconds) else None
+    return row
+
+
+class BacktestSummary:
+    """Erreurs de toutes les fenêtres et durées des appels, cumulées par moteur et par type."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.engines = {}
+
+    def add(self, row):
+        if row["status"] != "success":
+            return
+
+        engine = self.engines.setdefault(row["engine"], {"windows": 0, "call_seconds": [], "metrics": {}})
+        engine["windows"] += row["windows"]
+        engine["call_seconds"].extend(row["call_seconds"])
+
+        metric = engine["metrics"].setdefault(row["type"], {"series": 0, "windows": 0, "horizons": {}})
+        metric["series"] += 1
+        metric["windows"] += row["windows"]
+        for h, errors in row["horizons"].items():
+            cumulated = metric["horizons"].setdefault(h, {"mape": [], "mae": []})
+            cumulated["mape"].extend(errors["mape"])
+            cumulated["mae"].extend(errors["mae"])
+
+    def to_dict(self):
+        elapsed = time.perf_counter() - self.started
+        windows = sum(engine["windows"] for engine in self.engines.values())
+        return {
+            "status": "summary",
+            "seconds": elapsed,
+            "windows": windows,
+            "windows_per_second": windows / elapsed if elapsed else None,
+            "engines": {
+                name: {
+                    "windows": engine["windows"],
+                    "engine_seconds": sum(engine["call_seconds"]),
+                    "windows_per_second": engine["windows"] / sum(engine["call_seconds"]) if sum(engine["call_seconds"]) else None,
+                    "latency_ms": percentiles(engine["call_seconds"]),
+                    "metrics": {
+                        identifier: {
+                            "series": metric["series"],
+                            "windows": metric["windows"],
+                            "by_horizon": horizon_distributions(metric["horizons"]),
+                        }
+                        for identifier, metric in engine["metrics"].items()
+                    },
+                }
+                for name, engine in self.engines.items()
+            },
+        }
+
+
+async def run_backtest(filenames, load, identifiers=None, engines=None, step=BACKTEST_STEP_HOURS,
+                       max_origins=BACKTEST_MAX_ORIGINS, concurrency=BACKTEST_CONCURRENCY):
+    """
+    Backtest de plusieurs moteurs sur les séries de plusieurs fichiers.
+
+    Une tâche par (fichier, moteur) s'exécute dans le pool de calcul, `concurrency`
+    au plus à la fois ; chacune n'ouvre son jeu de données (`await load(nom)`, None
+    pour un fichier absent) qu'à son démarrage et le libère à sa fin. Produit les
+    lignes de résultats de chaque tâche dès qu'elle est terminée, puis une ligne de
+    synthèse : distributions des erreurs de toutes les fenêtres par moteur, type et
+    horizon, latence des appels et débit.
+    """
+    identifiers = list(identifiers or BATCH_METRICS)
+    engines = list(engines or ENGINES)
+    semaphore = asyncio.Semaphore(concurrency)
+    summary = BacktestSummary()
+
+    async def run(filename, engine):
+        async with semaphore:
+            try:
+                store = await load(filename)
+                if store is None:
+                    # Fichier absent : signalé une seule fois, pas pour chaque moteur
+                    return [not_found_row(filename)] if engine == engines[0] else []
+                return await compute_pool.run_on_dataset(
+                    "backtest", store, backtest_file, filename, identifiers, engine, step, max_origins
+                )
+            except Exception as e:
+                detail = task_error_detail(e)
+                return [series_row(filename, identifier, "error", engine=engine, detail=detail) for identifier in identifiers]
+
+    tasks = [asyncio.ensure_future(run(filename, engine)) for filename in filenames for engine in engines]
+    try:
+        for done in asyncio.as_completed(tasks):
+            rows = await done
+            for row in rows:
+                summary.add(row)
+            yield [summarize_row(row) for row in rows]
+        yield [summary.to_dict()]
+    finally:
+        # Client déconnecté ou erreur : ne pas laisser tourner les tâches restantes
+        for task in tasks:
+            task.cancel()
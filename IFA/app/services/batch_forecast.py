@@ -0,0 +1,130 @@
+import asyncio
+import time
+from app.config import FORECAST_ENGINE, FORECAST_BATCH_SERIES, FORECAST_BATCH_CONCURRENCY
+from app.services.compute_pool import compute_pool, ComputeSaturatedError, DatasetUnavailableError
+from app.services.timeseries_forecasting import prepare_series_batch, forecast_series_batch, FORECAST_HORIZON, PHYSICAL_RANGES
+from app.services.watsonx_client import WatsonxError
+
+# Métriques prévues par défaut pour chaque patient
+BATCH_METRICS = [
+    "HKQuantityTypeIdentifierHeartRate",
+    "HKQuantityTypeIdentifierOxygenSaturation",
+    "HKQuantityTypeIdentifierRespiratoryRate",
+    "HKQuantityTypeIdentifierHeartRateVariabilitySDNN",
+]
+
+# Points horaires minimum d'une série : un contexte et une période de validation d'au moins un horizon chacun
+MIN_SERIES_POINTS = 2 * FORECAST_HORIZON
+
+
+def series_row(filename, identifier, status, **fields):
+    return {"filename": filename, "type": identifier, "status": status, **fields}
+
+
+def not_found_row(filename):
+    return {"filename": filename, "status": "not_found"}
+
+
+def forecast_files(stores, filenames, identifiers, engine):
+    """
+    Prépare puis prévoit toutes les séries d'un lot de fichiers (exécutée dans le pool de calcul).
+
+    Les séries de chaque fichier sont préparées en un passage, puis toutes les
+    séries du lot sont envoyées ensemble au moteur. Retourne une ligne par
+    (fichier, type) : prévision et MAPE, données insuffisantes ou erreur du moteur.
+    """
+    rows = []
+    slots = []
+    series = []
+    for filename, store in zip(filenames, stores):
+        prepared = prepare_series_batch(store, identifiers)
+        for identifier in identifiers:
+            df = prepared.get(identifier)
+            points = 0 if df is None else len(df)
+            if points < MIN_SERIES_POINTS:
+                rows.append(series_row(filename, identifier, "insufficient_data", points=points))
+            else:
+                slots.append((filename, identifier))
+                series.append(df)
+
+    if not series:
+        return rows
+
+    try:
+        outputs = forecast_series_batch(series, engine, [PHYSICAL_RANGES.get(identifier) for _, identifier in slots])
+    except (WatsonxError, ValueError) as e:
+        return rows + [series_row(filename, identifier, "error", detail=str(e)) for filename, identifier in slots]
+
+    for (filename, identifier), (results, mape) in zip(slots, outputs):
+        rows.append(series_row(filename, identifier, "success", mape=mape, forecast=results))
+    return rows
+
+
+def task_error_detail(e):
+    """Message d'erreur d'une tâche du pool de calcul qui n'a pas pu s'exécuter."""
+    if isinstance(e, ComputeSaturatedError):
+        return e.detail
+    if isinstance(e, DatasetUnavailableError):
+        return "Dataset no longer available."
+    return str(e) or type(e).__name__
+
+
+def plan_batches(filenames, identifiers, batch_series=FORECAST_BATCH_SERIES):
+    """Découpe les fichiers en lots d'environ `batch_series` séries (tous les types d'un fichier dans le même lot)."""
+    files_per_batch = max(batch_series // max(len(identifiers), 1), 1)
+    return [filenames[start:start + files_per_batch] for start in range(0, len(filenames), files_per_batch)]
+
+
+async def load_stores(filenames, load):
+    """Ouvre un par un les jeux de données de fichiers (`await load(nom)`, None si absent) ; retourne (trouvés, absents)."""
+    stores = {}
+    missing = []
+    for filename in filenames:
+        store = await load(filename)
+        if store is None:
+            missing.append(filename)
+        else:
+            stores[filename] = store
+    return stores, missing
+
+
+async def run_batch_forecast(filenames, load, identifiers=None, engine=FORECAST_ENGINE, batch_series=FORECAST_BATCH_SERIES,
+                             concurrency=FORECAST_BATCH_CONCURRENCY):
+    """
+    Prévoit les séries de plusieurs fichiers et produit les lignes de résultats de
+    chaque lot dès qu'il est terminé.
+
+    Les jeux de données d'un lot ne sont ouverts (`await load(nom)`, None pour un
+    fichier absent) qu'au démarrage du lot et libérés à sa fin : seuls les lots en
+    cours sont gardés en mémoire. Au plus `concurrency` lots sont en cours à la
+    fois dans le pool de calcul ; la durée totale dépend du nombre de lots, pas du
+    nombre de séries. Un lot qui ne peut pas être exécuté produit une ligne
+    d'erreur par série plutôt que d'interrompre les autres.
+    """
+    identifiers = list(identifiers or BATCH_METRICS)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(batch):
+        async with semaphore:
+            started = time.perf_counter()
+            stores, missing, rows = {}, [], []
+            try:
+                stores, missing = await load_stores(batch, load)
+                if stores:
+                    rows = await compute_pool.run_on_datasets(
+                        "forecast_batch", list(stores.values()), forecast_files, list(stores), identifiers, engine
+                    )
+            except Exception as e:
+                detail = task_error_detail(e)
+                rows = [series_row(filename, identifier, "error", detail=detail) for filename in stores or batch for identifier in identifiers]
+            elapsed = time.perf_counter() - started
+            return [not_found_row(filename) for filename in missing] + [{**row, "batch_seconds": elapsed} for row in rows]
+
+    tasks = [asyncio.ensure_future(run(batch)) for batch in plan_batches(list(filenames), identifiers, batch_series)]
+    try:
+        for done in asyncio.as_completed(tasks):
+            yield await done
+    finally:
+        # Client déconnecté ou erreur : ne pas laisser tourner les lots restants
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,243 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from app.config import (
+    COMPUTE_EXECUTOR,
+    COMPUTE_WORKERS,
+    COMPUTE_MAX_PENDING,
+    COMPUTE_QUEUE_TIMEOUT_SECONDS,
+    COMPUTE_WORKER_CACHE_BYTES,
+    DISK_CACHE_DIR,
+)
+from app.services.disk_store import DiskStore
+
+# Nombre de mesures conservées par file pour les percentiles de temps d'attente et d'exécution
+STATS_WINDOW = 1024
+
+
+class ComputeSaturatedError(Exception):
+    """
+    Levée quand une file de calcul ne peut pas prendre la tâche : file pleine (429)
+    ou attente supérieure au délai configuré (503).
+    """
+
+    def __init__(self, status_code, detail, retry_after=1):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class DatasetUnavailableError(Exception):
+    """Levée dans un processus de calcul quand la version demandée n'est plus sur le disque."""
+
+
+_worker_datasets = OrderedDict()  # version -> (store, taille)
+_worker_bytes = 0
+_worker_disk_store = None
+
+
+def load_worker_dataset(version, max_bytes=COMPUTE_WORKER_CACHE_BYTES):
+    """
+    Ouvre (ou reprend) dans le processus de calcul le jeu de données persisté d'une version.
+
+    Les jeux de données ouverts sont gardés pour les tâches suivantes dans la limite
+    de `max_bytes` (mesurés comme dans le cache des fichiers) : les moins récemment
+    utilisés sont refermés au-delà, le dernier ouvert est toujours conservé.
+    """
+    global _worker_disk_store, _worker_bytes
+
+    entry = _worker_datasets.get(version)
+    if entry is not None:
+        _worker_datasets.move_to_end(version)
+        return entry[0]
+
+    if _worker_disk_store is None:
+        _worker_disk_store = DiskStore(DISK_CACHE_DIR)
+
+    store = _worker_disk_store.load_version(version)
+    if store is None:
+        raise DatasetUnavailableError(version)
+
+    size = store.memory_usage()
+    _worker_datasets[version] = (store, size)
+    _worker_bytes += size
+    while _worker_bytes > max_bytes and len(_worker_datasets) > 1:
+        _, (_, evicted) = _worker_datasets.popitem(last=False)
+        _worker_bytes -= evicted
+    return store
+
+
+def dataset_task(version, fn, args):
+    """Tâche exécutée dans un processus de calcul : `fn` reçoit le jeu de données relu depuis le disque."""
+    return fn(load_worker_dataset(version), *args)
+
+
+def datasets_task(versions, fn, args):
+    """Tâche exécutée dans un processus de calcul : `fn` reçoit la liste des jeux de données relus depuis le disque."""
+    return fn([load_worker_dataset(version) for version in versions], *args)
+
+
+def timed_task(fn, args):
+    """Exécute une tâche en notant l'heure à laquelle un worker l'a prise en charge."""
+    return time.time(), fn(*args)
+
+
+class QueueStats:
+    """Compteurs et temps d'attente / d'exécution récents d'une file de calcul."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_times = deque(maxlen=STATS_WINDOW)
+        self.run_times = deque(maxlen=STATS_WINDOW)
+
+    def to_dict(self, max_pending):
+        return {
+            "in_flight": self.in_flight,
+            "max_pending": max_pending,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_ms": percentiles(self.wait_times),
+            "run_ms": percentiles(self.run_times),
+        }
+
+
+def percentiles(samples):
+    """Résume des durées (secondes) en millisecondes : moyenne, p50, p95, p99 et maximum."""
+    if not samples:
+        return None
+
+    values = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "mean": float(values.mean()),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "max": float(values.max()),
+    }
+
+
+class ComputePool:
+    """
+    Exécuteur partagé des calculs lourds (KPIs, forecasting, scores), hors de la boucle d'événements.
+
+    Les tâches sont réparties en files nommées ("kpi", "forecast", "scores"...) qui
+    partagent le même pool de workers. Chaque file accepte au plus `max_pending`
+    tâches en cours ou en attente : au-delà, la tâche est refusée (429) plutôt que
+    d'allonger indéfiniment l'attente. Une tâche restée plus de `queue_timeout`
+    secondes sans être prise en charge est annulée (503).
+
+    En mode "process", les calculs sur un jeu de données tournent dans un pool de
+    processus : seule la version du jeu de données est transmise, chaque processus
+    relit la copie memory-mappée du cache disque. Sans cache disque (ou en mode
+    "thread"), un pool de threads est utilisé.
+    """
+
+    def __init__(self, mode=COMPUTE_EXECUTOR, workers=COMPUTE_WORKERS, max_pending=COMPUTE_MAX_PENDING,
+                 queue_timeout=COMPUTE_QUEUE_TIMEOUT_SECONDS):
+        self.processes = mode == "process" and bool(DISK_CACHE_DIR)
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._executor = None
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        # Création à la première tâche : importer l'application ne démarre aucun processus
+        with self._lock:
+            if self._executor is None:
+                if self.processes:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="compute")
+            return self._executor
+
+    def queue(self, name):
+        with self._lock:
+            return self._queues.setdefault(name, QueueStats())
+
+    async def run_on_dataset(self, queue, store, fn, *args):
+        """Exécute `fn(store, *args)` dans la file `queue` et retourne son résultat."""
+        if self.processes:
+            return await self.run(queue, dataset_task, store.version, fn, args)
+        return await self.run(queue, fn, store, *args)
+
+    async def run_on_datasets(self, queue, stores, fn, *args):
+        """Exécute `fn(stores, *args)` (plusieurs jeux de données) dans la file `queue` et retourne son résultat."""
+        if self.processes:
+            return await self.run(queue, datasets_task, [store.version for store in stores], fn, args)
+        return await self.run(queue, fn, stores, *args)
+
+    async def run(self, queue, fn, *args):
+        """Exécute `fn(*args)` dans la file `queue` ; lève ComputeSaturatedError si la file est saturée."""
+        stats = self.queue(queue)
+        if stats.in_flight >= self.max_pending:
+            stats.rejected += 1
+            raise ComputeSaturatedError(429, f"Too many '{queue}' computations pending, retry later.")
+
+        stats.in_flight += 1
+        stats.submitted += 1
+        submitted_at = time.time()
+        try:
+            future = self.executor.submit(timed_task, fn, args)
+            waiter = asyncio.wrap_future(future)
+
+            # Ne pas laisser une tâche attendre indéfiniment un worker libre
+            done, _ = await asyncio.wait({waiter}, timeout=self.queue_timeout or None)
+            if not done and future.cancel():
+                stats.timed_out += 1
+                raise ComputeSaturatedError(
+                    503, f"'{queue}' computation could not start within {self.queue_timeout}s, retry later.",
+                    retry_after=int(self.queue_timeout) or 1,
+                )
+
+            try:
+                started_at, result = await waiter
+            except Exception:
+                stats.failed += 1
+                raise
+
+            stats.completed += 1
+            stats.wait_times.append(max(started_at - submitted_at, 0.0))
+            stats.run_times.append(time.time() - started_at)
+            return result
+        finally:
+            stats.in_flight -= 1
+
+    def stats(self):
+        """Retourne la configuration du pool et les métriques de chaque file."""
+        with self._lock:
+            queues = dict(self._queues)
+        return {
+            "executor": "process" if self.processes else "thread",
+            "workers": self.workers,
+            "queue_timeout_seconds": self.queue_timeout,
+            "queues": {name: stats.to_dict(self.max_pending) for name, stats in queues.items()},
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Pool partagé par toutes les routes
+compute_pool = ComputePool()
@@ -0,0 +1,260 @@
+import threading
+import time
+from collections import OrderedDict
+from app.config import DATASET_CACHE_MAX_BYTES, DATASET_CACHE_TTL_SECONDS
+
+
+class CacheBudgetError(Exception):
+    """Levée quand un jeu de données dépasse à lui seul le budget mémoire du cache."""
+
+
+class DatasetCache:
+    """
+    Cache LRU des jeux de données uploadés, borné par un budget mémoire.
+
+    La taille réelle de chaque entrée (enregistrements et cube d'agrégats) est
+    mesurée à l'insertion ; les fichiers les moins récemment utilisés sont évincés
+    jusqu'à revenir sous le budget. Une durée de vie optionnelle (ttl_seconds),
+    comptée depuis l'upload, fait expirer les fichiers trop anciens : un fichier
+    expiré est retiré de la mémoire et du backend, il faut l'uploader à nouveau.
+    `on_remove(filename)` est appelée à chaque retrait d'un fichier de la mémoire
+    (remplacement, éviction, expiration, suppression).
+
+    Avec un `backend` persistant (DiskStore), chaque jeu de données inséré y est
+    aussi écrit, et un fichier absent de la mémoire (évincé, uploadé sur un autre
+    worker, ou après un redémarrage) y est relu avant d'être déclaré introuvable.
+    Le backend fait foi : une entrée en mémoire dont la version ne correspond plus
+    à celle du disque (fichier remplacé ou supprimé par un autre worker) est écartée.
+
+    Les fichiers de même contenu (même version) partagent un seul jeu de données
+    en mémoire, compté une seule fois dans le budget.
+    """
+
+    def __init__(self, max_bytes=DATASET_CACHE_MAX_BYTES, ttl_seconds=DATASET_CACHE_TTL_SECONDS, on_remove=None, backend=None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.on_remove = on_remove
+        self.backend = backend
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_loads = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # filename -> (store, taille, date d'insertion)
+        self._versions = {}  # version -> nombre de fichiers qui la partagent
+        self._lock = threading.Lock()
+
+    def __contains__(self, filename):
+        return self.get(filename, count=False) is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, filename, default=None, count=True):
+        """Retourne le jeu de données d'un fichier (et le marque comme récemment utilisé)."""
+        store, expired = self._get_in_memory(filename, count)
+
+        if self.backend is not None:
+            # Copie en mémoire périmée : le fichier a été remplacé ou supprimé par un autre worker
+            if store is not None and self.backend.version_of(filename) != store.version:
+                self._discard(filename, store)
+                store = None
+
+            # Absent de la mémoire (ou expiré) : relire la copie persistée, sauf si elle a expiré aussi
+            if store is None:
+                age = self.backend.age(filename)
+                if self._too_old(age):
+                    self._expire_backend(filename)
+                    if not expired:
+                        self.expirations += 1
+                    return default
+
+                store = self._shared(self.backend.version_of(filename)) or self.backend.load(filename)
+                if store is not None:
+                    self._insert(filename, store, inserted_at=time.monotonic() - (age or 0.0))
+                    self.disk_loads += 1
+
+        return default if store is None else store
+
+    def _get_in_memory(self, filename, count):
+        """Retourne le jeu de données en mémoire (ou None) et si l'entrée vient d'expirer."""
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is not None and self._expired(entry):
+                self._remove(filename)
+                self.expirations += 1
+                return None, True
+
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return None, False
+
+            self._entries.move_to_end(filename)
+            if count:
+                self.hits += 1
+            return entry[0], False
+
+    def filenames(self):
+        """Noms des fichiers en cache, en mémoire ou persistés."""
+        with self._lock:
+            names = list(self._entries)
+        if self.backend is not None:
+            names += [name for name in self.backend.filenames() if name not in names]
+        return names
+
+    def get_version(self, version):
+        """Retourne un jeu de données déjà en cache (sous n'importe quel nom) ayant cette version, ou None."""
+        store = self._shared(version)
+        if store is None and self.backend is not None:
+            store = self.backend.load_version(version)
+        return store
+
+    def __getitem__(self, filename):
+        store = self.get(filename)
+        if store is None:
+            raise KeyError(filename)
+        return store
+
+    def __setitem__(self, filename, store):
+        shared = self._shared(store.version)
+        size = None if shared is not None else self._check_budget(filename, store)
+
+        if self.backend is not None:
+            self.backend.save(filename, store)
+            if shared is None:
+                # Garder la copie memory-mappée, dont les pages sont partagées avec les autres workers
+                mapped = self.backend.load(filename)
+                if mapped is not None:
+                    store, size = mapped, None
+
+        self._insert(filename, shared or store, size)
+
+    def _shared(self, version):
+        """Jeu de données déjà en mémoire (sous n'importe quel nom) ayant cette version, ou None."""
+        entry = self._shared_entry(version)
+        return None if entry is None else entry[0]
+
+    def _shared_entry(self, version):
+        with self._lock:
+            for entry in self._entries.values():
+                if entry[0].version == version:
+                    return entry
+        return None
+
+    def _check_budget(self, filename, store):
+        size = store.memory_usage()
+        if size > self.max_bytes:
+            raise CacheBudgetError(
+                f"Dataset '{filename}' needs {size} bytes, more than the cache budget of {self.max_bytes} bytes."
+            )
+        return size
+
+    def _insert(self, filename, store, size=None, inserted_at=None):
+        shared = self._shared_entry(store.version)
+        if shared is not None:
+            store, size = shared[0], shared[1]
+        elif size is None:
+            size = self._check_budget(filename, store)
+
+        with self._lock:
+            if filename in self._entries:
+                self._remove(filename)
+
+            self._entries[filename] = (store, size, time.monotonic() if inserted_at is None else inserted_at)
+            # Un jeu de données partagé par plusieurs fichiers n'est compté qu'une fois
+            if not self._versions.get(store.version):
+                self.bytes += size
+            self._versions[store.version] = self._versions.get(store.version, 0) + 1
+
+            # Évincer les fichiers les moins récemment utilisés jusqu'à respecter le budget
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, filename):
+        """Supprime un fichier du cache (et sa copie persistée) ; retourne False s'il était inconnu."""
+        with self._lock:
+            found = filename in self._entries
+            if found:
+                self._remove(filename)
+
+        if self.backend is not None and self.backend.version_of(filename) is not None:
+            self.backend.delete(filename)
+            found = True
+
+        return found
+
+    def clear(self):
+        """Vide le cache et sa copie persistée (les compteurs sont conservés)."""
+        with self._lock:
+            for filename in list(self._entries):
+                self._remove(filename)
+
+        if self.backend is not None:
+            self.backend.clear()
+
+    def purge_expired(self):
+        """Supprime les entrées dont la durée de vie est dépassée (et leur copie persistée)."""
+        expired = []
+        with self._lock:
+            for filename, entry in list(self._entries.items()):
+                if self._expired(entry):
+                    self._remove(filename)
+                    self.expirations += 1
+                    expired.append(filename)
+
+        for filename in expired:
+            if self.backend is not None and self._too_old(self.backend.age(filename)):
+                self._expire_backend(filename)
+
+    def stats(self):
+        """Retourne le nombre d'entrées, la mémoire utilisée et les compteurs du cache."""
+        self.purge_expired()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "datasets": len(self._versions),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "disk_loads": self.disk_loads,
+                "files": {filename: size for filename, (_, size, _) in self._entries.items()},
+            }
+
+    def _discard(self, filename, store):
+        """Retire une entrée de la mémoire si elle contient toujours ce jeu de données."""
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is not None and entry[0] is store:
+                self._remove(filename)
+
+    def _expire_backend(self, filename):
+        """Retire du backend un fichier expiré (sauf s'il vient d'être remplacé par un autre upload)."""
+        version = self.backend.version_of(filename)
+        if version is not None:
+            self.backend.delete(filename, version=version)
+
+    def _expired(self, entry):
+        return self._too_old(time.monotonic() - entry[2])
+
+    def _too_old(self, age):
+        return age is not None and self.ttl_seconds > 0 and age > self.ttl_seconds
+
+    def _remove(self, filename):
+        store, size, _ = self._entries.pop(filename)
+        self._versions[store.version] -= 1
+        if not self._versions[store.version]:
+            del self._versions[store.version]
+            self.bytes -= size
+        if self.on_remove is not None:
+            self.on_remove(filename)
+        return store
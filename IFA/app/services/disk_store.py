@@ -0,0 +1,320 @@
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote, unquote
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from app.config import DISK_CACHE_DIR
+from app.services.record_store import RecordStore, ROLLUP_COLUMNS, ROLLUP_GRAINS, is_json_column
+
+try:
+    import fcntl
+except ImportError:  # Windows : le verrou ne protège que les threads du processus
+    fcntl = None
+
+
+RECORDS_FILE = "records.arrow"
+ROLLUPS_FILE = "rollups.arrow"
+LOCK_FILE = ".lock"
+
+# Métadonnées du schéma Arrow listant les colonnes imbriquées stockées en JSON
+JSON_COLUMNS_KEY = b"ifa.json_columns"
+
+# Format des jeux de données persistés (dates UTC, décalage horaire de startDate, cube en heure locale) ;
+# un jeu de données d'un autre format est ignoré et reparsé au prochain upload
+FORMAT_KEY = b"ifa.format"
+FORMAT_VERSION = b"2"
+
+
+def write_table(table, path):
+    """Écrit une table Arrow au format IPC (fichier), de manière atomique."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def write_text(path, text):
+    """Écrit un petit fichier texte de manière atomique."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+
+def encode_name(filename):
+    """
+    Nom du fichier `names/<nom>` d'un fichier uploadé : encodé en URL, avec le point
+    initial échappé ("." et ".." désignent des répertoires) ; le nom vide devient "%".
+    """
+    name = quote(filename, safe="")
+    if name.startswith("."):
+        return "%2E" + name[1:]
+    return name or "%"
+
+
+def decode_name(name):
+    """Nom de fichier uploadé correspondant à un fichier de `names/`."""
+    return "" if name == "%" else unquote(name)
+
+
+def read_table(path):
+    """Ouvre une table Arrow IPC par memory-mapping (les colonnes ne sont lues qu'à l'accès)."""
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def records_to_table(records):
+    """Convertit les enregistrements en table Arrow ; les colonnes imbriquées (MetadataEntry...) y restent en texte JSON."""
+    json_columns = [column for column in records.columns if is_json_column(records[column])]
+
+    table = pa.Table.from_pandas(records, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), JSON_COLUMNS_KEY: json.dumps(json_columns).encode()}
+    return table.replace_schema_metadata(metadata)
+
+
+def without_null_masks(table):
+    """
+    Remplace les valeurs nulles des colonnes de dates et de flottants par NaT / NaN.
+
+    Sans masque de validité, pandas reprend ces colonnes telles quelles depuis le
+    fichier mappé ; avec un masque, il en ferait une copie privée (remplie de NaT
+    ou de NaN) dans chaque processus qui relit le jeu de données.
+    """
+    for position, field in enumerate(table.schema):
+        column = table.column(position)
+        if not column.null_count:
+            continue
+        if pa.types.is_timestamp(field.type):
+            # NaT est l'entier minimal, comme dans NumPy
+            filled = pc.fill_null(column.cast(pa.int64()), pa.scalar(pd.NaT.value, pa.int64())).cast(field.type)
+        elif pa.types.is_floating(field.type):
+            filled = pc.fill_null(column, pa.scalar(float("nan"), field.type))
+        else:
+            continue
+        table = table.set_column(position, field, filled)
+    return table
+
+
+def records_file_table(records):
+    """Table Arrow persistée des enregistrements : valeurs nulles sans masque et format du jeu de données."""
+    table = without_null_masks(records_to_table(records))
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), FORMAT_KEY: FORMAT_VERSION})
+
+
+def is_current_format(table_or_path):
+    """Indique si une table persistée (ou le fichier qui la contient) est au format courant."""
+    if isinstance(table_or_path, str):
+        try:
+            schema = pa.ipc.open_file(pa.memory_map(table_or_path, "r")).schema
+        except FileNotFoundError:
+            return False
+    else:
+        schema = table_or_path.schema
+    return (schema.metadata or {}).get(FORMAT_KEY) == FORMAT_VERSION
+
+
+def table_to_records(table):
+    """
+    Reconstruit les enregistrements ; les colonnes numériques et de dates restent adossées au fichier mappé.
+
+    Les colonnes en texte JSON ne sont pas converties en objets Python : elles gardent
+    les tampons Arrow du fichier mappé (partagés entre processus) et ne sont lues qu'à
+    la sérialisation des lignes demandées.
+    """
+    json_columns = json.loads((table.schema.metadata or {}).get(JSON_COLUMNS_KEY, b"[]"))
+
+    records = table.drop_columns(json_columns).to_pandas(split_blocks=True)
+    for column in (name for name in table.column_names if name in json_columns):
+        text = table.column(column).cast(pa.large_string())
+        records.insert(table.column_names.index(column), column, pd.arrays.ArrowExtensionArray(text))
+
+    return records
+
+
+def rollups_to_table(rollups):
+    """Aplatit le cube {granularité: {type: DataFrame}} en une seule table Arrow."""
+    frames = [
+        rollup.reset_index().assign(grain=grain, type=identifier)
+        for grain, by_type in rollups.items()
+        for identifier, rollup in by_type.items()
+    ]
+    if not frames:
+        return pa.table({"grain": pa.array([], pa.string())})
+
+    return pa.Table.from_pandas(pd.concat(frames, ignore_index=True), preserve_index=False)
+
+
+def table_to_rollups(table, grains):
+    """Reconstruit le cube {granularité: {type: DataFrame}} à partir de sa table Arrow."""
+    rollups = {grain: {} for grain in grains}
+    if table.num_rows == 0:
+        return rollups
+
+    frame = table.to_pandas()
+    for (grain, identifier), group in frame.groupby(["grain", "type"], sort=False):
+        rollups[grain][identifier] = group.set_index("period")[ROLLUP_COLUMNS]
+
+    return rollups
+
+
+class DiskStore:
+    """
+    Cache persistant des jeux de données, partagé par tous les workers et qui
+    survit aux redémarrages.
+
+    Chaque jeu de données est écrit une seule fois, au format Arrow IPC, dans
+    `datasets/<empreinte>/` ; pour chaque nom de fichier uploadé, un petit fichier
+    `names/<nom>` contient l'empreinte à laquelle il renvoie. Les écritures sont
+    atomiques (fichier ou répertoire temporaire puis renommage) et les opérations
+    qui touchent à plusieurs fichiers sont protégées par un verrou inter-processus,
+    de sorte que plusieurs workers uvicorn peuvent partager le même répertoire.
+
+    À la lecture, les fichiers Arrow sont memory-mappés : les workers partagent les
+    mêmes pages du cache du système plutôt que de garder chacun sa copie.
+    """
+
+    def __init__(self, directory=DISK_CACHE_DIR):
+        self.directory = directory
+        self.names_dir = os.path.join(directory, "names")
+        self.datasets_dir = os.path.join(directory, "datasets")
+        self._lock = threading.Lock()
+        os.makedirs(self.names_dir, exist_ok=True)
+        os.makedirs(self.datasets_dir, exist_ok=True)
+
+    def save(self, filename, store):
+        """
+        Écrit un jeu de données (s'il n'existe pas déjà sur disque) et l'associe au nom de fichier.
+
+        Les fichiers sont écrits hors du verrou, dans un répertoire temporaire renommé
+        sous le verrou : un `_collect` concurrent ne peut pas supprimer un jeu de données
+        en cours d'écriture, ni entre sa vérification et son association au nom.
+        """
+        dataset_dir = os.path.join(self.datasets_dir, store.version)
+        staged = None
+        try:
+            while True:
+                with self._locked():
+                    if staged is not None and not self._complete(dataset_dir):
+                        # Répertoire incomplet ou d'un format antérieur : remplacé par la nouvelle écriture
+                        shutil.rmtree(dataset_dir, ignore_errors=True)
+                        os.rename(staged, dataset_dir)
+                        staged = None
+
+                    if self._complete(dataset_dir):
+                        previous = self.version_of(filename)
+                        write_text(self._name_path(filename), store.version)
+                        if previous is not None and previous != store.version:
+                            self._collect(previous)
+                        return
+
+                staged = self._stage(store)
+        finally:
+            if staged is not None:
+                shutil.rmtree(staged, ignore_errors=True)
+
+    def load(self, filename):
+        """Relit (par memory-mapping) le jeu de données associé à un nom de fichier, ou retourne None."""
+        version = self.version_of(filename)
+        if version is None:
+            return None
+
+        return self.load_version(version)
+
+    def load_version(self, version):
+        """Relit (par memory-mapping) le jeu de données d'une empreinte donnée, ou retourne None."""
+        dataset_dir = os.path.join(self.datasets_dir, version)
+        try:
+            table = read_table(os.path.join(dataset_dir, RECORDS_FILE))
+            rollups = table_to_rollups(read_table(os.path.join(dataset_dir, ROLLUPS_FILE)), ROLLUP_GRAINS)
+        except FileNotFoundError:
+            # Supprimé entre-temps par un autre worker
+            return None
+        if not is_current_format(table):
+            # Écrit par une version antérieure (cube en UTC) : à reparser
+            return None
+
+        records = table_to_records(table)
+
+        return RecordStore.restore(records, version, rollups)
+
+    def version_of(self, filename):
+        """Retourne l'empreinte du jeu de données associé à un nom de fichier, ou None."""
+        try:
+            with open(self._name_path(filename), "r", encoding="utf-8") as file:
+                return file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def age(self, filename):
+        """Temps écoulé (secondes) depuis l'enregistrement d'un nom de fichier, ou None s'il est inconnu."""
+        try:
+            return time.time() - os.path.getmtime(self._name_path(filename))
+        except FileNotFoundError:
+            return None
+
+    def filenames(self):
+        """Retourne les noms de fichiers persistés."""
+        return [decode_name(name) for name in os.listdir(self.names_dir) if not name.endswith(".tmp")]
+
+    def delete(self, filename, version=None):
+        """
+        Retire un nom de fichier ; les données ne sont supprimées que si plus aucun nom n'y renvoie.
+        Avec `version`, le nom n'est retiré que s'il désigne encore cette empreinte.
+        """
+        with self._locked():
+            current = self.version_of(filename)
+            if current is None or (version is not None and current != version):
+                return
+
+            os.remove(self._name_path(filename))
+            self._collect(current)
+
+    def clear(self):
+        """Supprime tous les jeux de données persistés."""
+        with self._locked():
+            for directory in (self.names_dir, self.datasets_dir):
+                shutil.rmtree(directory, ignore_errors=True)
+                os.makedirs(directory, exist_ok=True)
+
+    def _name_path(self, filename):
+        return os.path.join(self.names_dir, encode_name(filename))
+
+    def _complete(self, dataset_dir):
+        """Indique si un répertoire contient un jeu de données complet, au format courant."""
+        return os.path.exists(os.path.join(dataset_dir, ROLLUPS_FILE)) and is_current_format(
+            os.path.join(dataset_dir, RECORDS_FILE)
+        )
+
+    def _stage(self, store):
+        """Écrit un jeu de données dans un répertoire temporaire de `datasets/` et retourne son chemin."""
+        staged = os.path.join(self.datasets_dir, f"{store.version}.{os.getpid()}.{threading.get_ident()}.tmp")
+        os.makedirs(staged, exist_ok=True)
+        write_table(records_file_table(store.records), os.path.join(staged, RECORDS_FILE))
+        # Le cube est écrit en dernier : sa présence signale un jeu de données complet
+        write_table(rollups_to_table(store.rollups), os.path.join(staged, ROLLUPS_FILE))
+        return staged
+
+    def _collect(self, version):
+        """Supprime les données d'une empreinte à laquelle plus aucun nom ne renvoie (verrou déjà pris)."""
+        if version not in (self.version_of(filename) for filename in self.filenames()):
+            shutil.rmtree(os.path.join(self.datasets_dir, version), ignore_errors=True)
+
+    @contextmanager
+    def _locked(self):
+        """Verrou entre threads et, quand le système le permet, entre processus."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+
+            with open(os.path.join(self.directory, LOCK_FILE), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
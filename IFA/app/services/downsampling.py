@@ -0,0 +1,105 @@
+from datetime import date
+import numpy as np
+import pandas as pd
+
+# Méthodes de sous-échantillonnage des séries temporelles
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def time_axis(values):
+    """Abscisses d'une série : secondes depuis le premier point pour des dates, sinon la position de chaque point."""
+    if len(values) and (pd.api.types.is_datetime64_any_dtype(values) or isinstance(values.iloc[0], date)):
+        nanoseconds = pd.to_datetime(values).to_numpy(dtype="datetime64[ns]").astype("int64")
+        return (nanoseconds - nanoseconds[0]) / 1e9
+    return np.arange(len(values), dtype="float64")
+
+
+def lttb(x, y, max_points):
+    """
+    Largest-Triangle-Three-Buckets : positions d'au plus `max_points` points conservant l'allure de la série.
+
+    Le premier et le dernier point sont gardés ; les autres sont répartis en
+    max_points - 2 tranches, et chaque tranche garde le point formant le plus
+    grand triangle avec le point retenu dans la tranche précédente et la moyenne
+    de la tranche suivante. Les moyennes et les aires d'une tranche sont calculées
+    en NumPy : la boucle ne porte que sur les tranches.
+    """
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    # Bornes des tranches [edges[i], edges[i + 1]) des points intérieurs (toutes non vides)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    counts = np.diff(edges)
+
+    # Troisième sommet de chaque tranche : moyenne de la tranche suivante (le dernier point pour la dernière)
+    mean_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    anchor = 0
+    for bucket in range(max_points - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        # Double de l'aire des triangles (point retenu, candidat, moyenne suivante)
+        area = np.abs(
+            (x[anchor] - next_x[bucket]) * (y[lo:hi] - y[anchor])
+            - (x[anchor] - x[lo:hi]) * (next_y[bucket] - y[anchor])
+        )
+        anchor = lo + int(np.argmax(area))
+        selected[bucket + 1] = anchor
+
+    return selected
+
+
+def bucket_extremes(values, edges, sizes, bucket_ids, reduce):
+    """Position de la première valeur extrême (np.fmin / np.fmax, NaN ignorés) de chaque tranche, en O(n)."""
+    extremes = reduce.reduceat(values, edges[:-1])
+    positions = np.flatnonzero(values == np.repeat(extremes, sizes))
+    _, first = np.unique(bucket_ids[positions], return_index=True)
+    return positions[first]
+
+
+def min_max(low, max_points, high=None):
+    """
+    Enveloppe min / max : positions du minimum de `low` et du maximum de `high`
+    (par défaut `low`) dans chaque tranche, plus le premier et le dernier point.
+    Aucun pic n'est perdu, au plus `max_points` points sont gardés.
+    """
+    n = len(low)
+    if max_points >= n:
+        return np.arange(n)
+    high = low if high is None else high
+
+    buckets = max((max_points - 2) // 2, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    sizes = np.diff(edges)
+    bucket_ids = np.repeat(np.arange(buckets), sizes)
+
+    lows = bucket_extremes(low, edges, sizes, bucket_ids, np.fmin)
+    highs = bucket_extremes(high, edges, sizes, bucket_ids, np.fmax)
+
+    return np.unique(np.concatenate(([0, n - 1], lows, highs)))
+
+
+def downsample_frame(frame, max_points, method="lttb"):
+    """
+    Réduit une série (période en première colonne, valeur en deuxième) à au plus
+    `max_points` lignes, par LTTB ou enveloppe min / max. Une série comportant des
+    colonnes "min" et "max" garde, avec "minmax", ses extrêmes de chaque tranche.
+    """
+    if frame is None or len(frame) <= max_points:
+        return frame
+
+    values = frame.iloc[:, 1].to_numpy(dtype="float64")
+    if method == "minmax":
+        if "min" in frame and "max" in frame:
+            positions = min_max(frame["min"].to_numpy(dtype="float64"), max_points, frame["max"].to_numpy(dtype="float64"))
+        else:
+            positions = min_max(values, max_points)
+    else:
+        positions = lttb(time_axis(frame.iloc[:, 0]), values, max_points)
+
+    return frame.iloc[positions].reset_index(drop=True)
@@ -1,5 +1,25 @@
+import hashlib
 import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
 import pandas as pd
+from app.services.record_store import coerce_record_types, concat_record_batches, offset_minutes
+
+
+# Nombre d'enregistrements accumulés avant conversion en DataFrame
+BATCH_SIZE = 50_000
+
+
+# Taille des blocs lus pour calculer l'empreinte d'un fichier
+DIGEST_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(file):
+    """Calcule l'empreinte SHA-256 du contenu d'un fichier, puis le rembobine pour le parsing."""
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: file.read(DIGEST_CHUNK_SIZE), b""):
+        sha256.update(chunk)
+    file.seek(0)
+    return sha256.hexdigest()
 
 
 def parse_element(element):
@@ -15,18 +35,75 @@ def parse_element(element):
     return data
 
 
-def extract_data(xml_file):
-    """Charge le fichier XML et extrait toutes les données pertinentes."""
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
+def record_date(element):
+    """Date de création (à défaut, de début) d'un <Record> en UTC, au format 'AAAA-MM-JJ HH:MM:SS'."""
+    value = element.get("creationDate") or element.get("startDate") or ""
+    local, offset = value[:19], offset_minutes(value[20:])
+    if not offset:
+        return local
+    try:
+        return (datetime.fromisoformat(local) - timedelta(minutes=offset)).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return local
+
+
+def extract_data(xml_file, batch_size=BATCH_SIZE, since=None, progress=None):
+    """
+    Parcourt le fichier XML en streaming et extrait tous les enregistrements <Record>.
+
+    Le document n'est jamais chargé en entier : chaque élément est libéré dès qu'il
+    a été lu et les enregistrements sont convertis en DataFrame typé par lots, ce qui
+    garde la mémoire quasi constante quelle que soit la taille de l'export.
+
+    Avec `since` ('AAAA-MM-JJ HH:MM:SS', en UTC), seuls les enregistrements créés après cette
+    date sont extraits ; les autres sont ignorés sans être convertis.
+
+    `progress(n)`, si fourni, est appelée après chaque lot avec le nombre total
+    d'enregistrements extraits jusque-là.
+    """
+    batches = []
+    records = []
+    extracted = 0
+    root = None
+    depth = 0
+
+    for event, element in ET.iterparse(xml_file, events=("start", "end")):
+        if event == "start":
+            # Conserver la racine pour pouvoir la vider au fil de la lecture
+            if root is None:
+                root = element
+            depth += 1
+            continue
+
+        depth -= 1
+
+        if element.tag == "Record":
+            if since is None or record_date(element) > since:
+                records.append(parse_element(element))
+            element.clear()
+
+            if len(records) >= batch_size:
+                batches.append(coerce_record_types(pd.DataFrame(records)))
+                extracted += len(records)
+                records = []
+                if progress is not None:
+                    progress(extracted)
+
+        # Libérer les éléments de premier niveau déjà traités (Record, Correlation, Workout...)
+        if depth == 1:
+            root.clear()
 
-    # Extraire les enregistrements <Record>
-    records = [parse_element(record) for record in root.iter('Record')]
+    if records:
+        batches.append(coerce_record_types(pd.DataFrame(records)))
+        extracted += len(records)
+        if progress is not None:
+            progress(extracted)
 
-    # Création des DataFrames
-    df_records = pd.DataFrame(records)  # Convertir les records en DataFrame
+    if not batches:
+        return pd.DataFrame()
 
-    return df_records  # Conversion en DataFrame
+    # Assembler les lots typés (les colonnes absentes d'un lot sont complétées par NaN)
+    return concat_record_batches(batches)
 
 
 def parse_ecg_file(file_path):
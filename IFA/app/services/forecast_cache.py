@@ -0,0 +1,142 @@
+import hashlib
+import os
+import threading
+import time
+import orjson
+import pandas as pd
+from app.config import FORECAST_CACHE_DIR, FORECAST_CACHE_TTL_SECONDS, FORECAST_CACHE_MAX_ENTRIES
+from app.services.disk_store import write_text
+
+# Nombre d'écritures d'un processus entre deux purges du répertoire
+PURGE_INTERVAL = 64
+
+
+class ForecastCache:
+    """
+    Cache persistant des prévisions, un fichier JSON par prévision.
+
+    Une prévision est indexée par l'empreinte de la fenêtre préparée (contexte et
+    horizon de validation servant au MAPE) et par les paramètres du modèle (modèle,
+    fréquence, longueur de contexte, horizon) : une série inchangée ne repasse pas
+    par le modèle distant. Les fichiers plus anciens que `ttl_seconds` (0 = jamais)
+    sont ignorés. Le cache est partagé par les processus de calcul et survit aux
+    redémarrages ; un répertoire vide le désactive.
+
+    Le répertoire est purgé toutes les PURGE_INTERVAL écritures d'un processus (et
+    à chaque lecture des statistiques) : les fichiers expirés sont supprimés, puis
+    les plus anciens au-delà de `max_entries` (0 = pas de limite).
+    """
+
+    def __init__(self, directory=FORECAST_CACHE_DIR, ttl_seconds=FORECAST_CACHE_TTL_SECONDS,
+                 max_entries=FORECAST_CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(window, model_id, freq, context_length, horizon, bounds=None):
+        """Empreinte d'une fenêtre (dates et valeurs, hachées en un seul passage vectorisé) et des paramètres."""
+        digest = hashlib.sha256(pd.util.hash_pandas_object(window, index=False).to_numpy().tobytes())
+        digest.update(repr((model_id, freq, context_length, horizon, bounds)).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Retourne la prévision (results, mape) enregistrée sous cette clé, ou None."""
+        if not self.directory:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                entry = orjson.loads(file.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            entry = None
+
+        if entry is not None and self.ttl_seconds > 0 and time.time() - entry["created_at"] > self.ttl_seconds:
+            self._remove(path)
+            entry = None
+
+        if entry is None:
+            return None
+        return entry["results"], entry["mape"]
+
+    def put(self, key, results, mape):
+        """Enregistre une prévision et la retourne sous la forme (results, mape)."""
+        mape = float(mape)
+        if self.directory:
+            entry = {"created_at": time.time(), "results": results, "mape": mape}
+            write_text(self._path(key), orjson.dumps(entry, default=str, option=orjson.OPT_SERIALIZE_NUMPY).decode())
+
+            with self._lock:
+                self._writes += 1
+                purge = self._writes % PURGE_INTERVAL == 1
+            if purge:
+                self.purge()
+        return results, mape
+
+    def purge(self):
+        """Supprime les prévisions expirées, puis les plus anciennes au-delà de `max_entries` ; retourne celles qui restent."""
+        now = time.time()
+        entries = []
+        for path, size, modified in self._entries():
+            if self.ttl_seconds > 0 and now - modified > self.ttl_seconds:
+                self._remove(path)
+            else:
+                entries.append((path, size, modified))
+
+        if self.max_entries > 0 and len(entries) > self.max_entries:
+            entries.sort(key=lambda entry: entry[2])
+            for path, _, _ in entries[:len(entries) - self.max_entries]:
+                self._remove(path)
+            entries = entries[len(entries) - self.max_entries:]
+        return entries
+
+    def clear(self):
+        """Supprime toutes les prévisions enregistrées."""
+        for path, _, _ in self._entries():
+            self._remove(path)
+
+    def stats(self):
+        """Retourne le nombre de prévisions enregistrées (après purge), leur taille et les limites du cache."""
+        entries = self.purge()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+        }
+
+    def _entries(self):
+        """Fichiers de prévisions : (chemin, taille, date de modification)."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for item in scan:
+                if not item.name.endswith(".json"):
+                    continue
+                try:
+                    stat = item.stat()
+                except FileNotFoundError:
+                    # Supprimé entre-temps par un autre processus
+                    continue
+                entries.append((item.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# Cache partagé par les routes et les processus de forecasting
+forecast_cache = ForecastCache()
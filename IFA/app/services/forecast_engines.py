@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from app.services.watsonx_client import get_watsonx_client, get_watsonx_ts_model
+
+# Format des dates des séries envoyées aux modèles et des prévisions renvoyées
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# Colonne identifiant chaque série d'une requête multi-séries
+SERIES_ID_COLUMN = "series_id"
+
+# Séries résolues ensemble par le moteur ridge (borne la mémoire des fenêtres glissantes)
+RIDGE_CHUNK_SERIES = 16
+
+
+def future_dates(timestamps, freq, horizon):
+    """Dates des `horizon` pas qui suivent la dernière date d'une série, au format des prévisions."""
+    last = pd.Timestamp(pd.Series(timestamps).iloc[-1])
+    return pd.date_range(last, periods=horizon + 1, freq=pd.Timedelta(freq))[1:].strftime(DATE_FORMAT).tolist()
+
+
+class ForecastEngine:
+    """
+    Moteur de forecasting : prévoit `horizon` pas d'une série à partir de sa fenêtre de contexte.
+
+    `predict` retourne un dictionnaire de colonnes ({date: [...], cible: [...]}),
+    comme les résultats du modèle Watsonx. `predict_many` prévoit plusieurs séries
+    à la fois (une par défaut, les moteurs la redéfinissent pour les traiter
+    ensemble). `model_id` identifie le modèle et ses réglages (clé du cache des prévisions).
+    """
+
+    name = None
+    model_id = None
+
+    def predict(self, data, timestamp_column, target_column, freq, horizon):
+        return self.predict_many([data], timestamp_column, target_column, freq, horizon)[0]
+
+    def predict_many(self, frames, timestamp_column, target_column, freq, horizon):
+        return [self.predict(data, timestamp_column, target_column, freq, horizon) for data in frames]
+
+
+class WatsonxEngine(ForecastEngine):
+    """Modèle Granite TinyTimeMixer distant, appelé par le client Watsonx partagé du processus."""
+
+    name = "watsonx"
+
+    @property
+    def model_id(self):
+        return get_watsonx_ts_model(get_watsonx_client())
+
+    def predict(self, data, timestamp_column, target_column, freq, horizon):
+        client = get_watsonx_client()
+        # Connexion et jeton IAM réutilisés d'une prévision à l'autre
+        return client.forecast(
+            data=data,
+            model_id=self.model_id,
+            timestamp_column=timestamp_column,
+            target_columns=[target_column],
+            freq=freq,
+        )['results'][0]
+
+    def predict_many(self, frames, timestamp_column, target_column, freq, horizon):
+        """Une seule requête pour toutes les séries, distinguées par une colonne d'identifiant."""
+        if len(frames) == 1:
+            return [self.predict(frames[0], timestamp_column, target_column, freq, horizon)]
+
+        data = pd.concat(
+            [frame[[timestamp_column, target_column]].assign(**{SERIES_ID_COLUMN: str(position)}) for position, frame in enumerate(frames)],
+            ignore_index=True,
+        )
+        results = get_watsonx_client().forecast(
+            data=data,
+            model_id=self.model_id,
+            timestamp_column=timestamp_column,
+            target_columns=[target_column],
+            freq=freq,
+            id_columns=[SERIES_ID_COLUMN],
+        )['results'][0]
+
+        # Répartir la table de résultats entre les séries
+        ids = np.asarray(results[SERIES_ID_COLUMN]).astype(str)
+        columns = {column: np.asarray(values) for column, values in results.items() if column != SERIES_ID_COLUMN}
+        return [
+            {column: values[ids == str(position)].tolist() for column, values in columns.items()}
+            for position in range(len(frames))
+        ]
+
+
+class SeasonalNaiveEngine(ForecastEngine):
+    """Saisonnier naïf : la dernière saison (24 h par défaut) est répétée sur l'horizon."""
+
+    name = "seasonal_naive"
+
+    def __init__(self, season=24):
+        self.season = season
+        self.model_id = f"local/seasonal-naive-{season}"
+
+    def predict(self, data, timestamp_column, target_column, freq, horizon):
+        values = data[target_column].to_numpy(dtype="float64")
+        return {
+            timestamp_column: future_dates(data[timestamp_column], freq, horizon),
+            target_column: np.resize(values[-self.season:], horizon).tolist(),
+        }
+
+
+class RidgeEngine(ForecastEngine):
+    """
+    Régression ridge sur les `lags` dernières valeurs, prévoyant tout l'horizon d'un coup.
+
+    Chaque position du contexte fournit un exemple (les `lags` valeurs qui la
+    précèdent, les `horizon` valeurs qui la suivent), extrait par fenêtre glissante
+    sans copie : une seule régression multi-sorties, sans prévision récursive.
+    Les séries de même longueur sont résolues ensemble (équations normales empilées,
+    résolues par un seul np.linalg.solve), comme le ferait sklearn.linear_model.Ridge
+    pour chacune.
+    """
+
+    name = "ridge"
+
+    def __init__(self, lags=168, alpha=1.0):
+        self.lags = lags
+        self.alpha = alpha
+        self.model_id = f"local/ridge-{lags}-{alpha}"
+
+    def predict_many(self, frames, timestamp_column, target_column, freq, horizon):
+        forecasts = [None] * len(frames)
+
+        # Regrouper les séries par longueur pour empiler leurs fenêtres
+        by_length = {}
+        for position, data in enumerate(frames):
+            by_length.setdefault(len(data), []).append(position)
+
+        for length, positions in by_length.items():
+            for start in range(0, len(positions), RIDGE_CHUNK_SERIES):
+                chunk = positions[start:start + RIDGE_CHUNK_SERIES]
+                values = np.stack([frames[position][target_column].to_numpy(dtype="float64") for position in chunk])
+                for position, forecast in zip(chunk, self.fit_predict(values, horizon)):
+                    forecasts[position] = {
+                        timestamp_column: future_dates(frames[position][timestamp_column], freq, horizon),
+                        target_column: forecast.tolist(),
+                    }
+
+        return forecasts
+
+    def fit_predict(self, values, horizon):
+        """Ajuste une régression par série (lignes de `values`, de même longueur) et prévoit `horizon` pas."""
+        lags = min(self.lags, values.shape[1] - horizon)
+        if lags < 1:
+            raise ValueError(f"At least {horizon + 1} points are needed to forecast {horizon} steps.")
+
+        windows = sliding_window_view(values, lags + horizon, axis=1)
+        inputs, targets = windows[..., :lags], windows[..., lags:]
+
+        # Données centrées (ordonnée à l'origine non pénalisée), puis (XᵀX + αI) w = XᵀY pour chaque série
+        input_mean = inputs.mean(axis=1, keepdims=True)
+        target_mean = targets.mean(axis=1, keepdims=True)
+        centered = inputs - input_mean
+        transposed = centered.transpose(0, 2, 1)
+        gram = transposed @ centered + self.alpha * np.eye(lags)
+        coef = np.linalg.solve(gram, transposed @ (targets - target_mean))
+
+        last = values[:, None, -lags:]
+        return ((last - input_mean) @ coef + target_mean)[:, 0, :]
+
+
+# Moteurs disponibles, par nom (paramètre `engine` de la route de forecasting)
+ENGINES = {engine.name: engine for engine in (WatsonxEngine(), SeasonalNaiveEngine(), RidgeEngine())}
+
+
+def get_engine(name):
+    """Retourne le moteur de forecasting d'un nom donné ; lève KeyError s'il n'existe pas."""
+    return ENGINES[name]
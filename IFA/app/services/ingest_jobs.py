@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.config import INGEST_WORKERS, INGEST_MAX_JOBS, INGEST_JOBS_DIR
+from app.services.disk_store import write_text
+
+
+class IngestError(Exception):
+    """Échec d'une ingestion, avec le code HTTP qui aurait été renvoyé par un upload synchrone."""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class ProgressReader:
+    """Enveloppe un fichier et reporte dans la tâche le nombre d'octets lus par le parser."""
+
+    def __init__(self, file, job):
+        self.file = file
+        self.job = job
+
+    def read(self, size=-1):
+        chunk = self.file.read(size)
+        self.job.bytes_read += len(chunk)
+        return chunk
+
+
+class IngestJob:
+    """État d'une ingestion en cours ou terminée (progression, résultat ou erreur)."""
+
+    def __init__(self, filename, bytes_total):
+        self.job_id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = "queued"
+        self.bytes_total = bytes_total
+        self.bytes_read = 0
+        self.records = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.status_code = None
+        self.on_update = None
+
+    def track(self, file):
+        """Retourne un lecteur du fichier qui met à jour la progression de la tâche."""
+        return ProgressReader(file, self)
+
+    def set_records(self, records):
+        self.records = records
+        if self.on_update is not None:
+            self.on_update(self)
+
+    def eta_seconds(self):
+        """Temps restant estimé d'après le débit de lecture observé."""
+        if self.status != "running" or not self.bytes_read:
+            return None
+        elapsed = time.time() - self.started_at
+        return elapsed * max(self.bytes_total - self.bytes_read, 0) / self.bytes_read
+
+    def to_dict(self):
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "status": self.status,
+            "bytes_total": self.bytes_total,
+            "bytes_read": self.bytes_read,
+            "records": self.records,
+            "progress": 1.0 if self.status == "done" else (self.bytes_read / self.bytes_total if self.bytes_total else None),
+            "elapsed_seconds": end - self.started_at if self.started_at else 0.0,
+            "eta_seconds": self.eta_seconds(),
+            "result": self.result,
+            "error": self.error,
+            "status_code": self.status_code,
+        }
+
+
+class IngestJobManager:
+    """
+    Exécute les ingestions d'uploads dans un pool de workers, hors de la boucle d'événements.
+
+    `ingest(job)` fait le travail (parsing, mise en cache) et retourne le résultat
+    à exposer ; une IngestError la fait échouer avec un code HTTP explicite. Les
+    tâches terminées les plus anciennes sont oubliées au-delà de `max_jobs`.
+
+    Avec `directory`, l'état de chaque tâche y est aussi écrit (à chaque
+    changement de statut et après chaque lot parsé) : un autre worker uvicorn que
+    celui qui exécute la tâche peut ainsi répondre aux requêtes de suivi.
+    """
+
+    def __init__(self, ingest, max_workers=INGEST_WORKERS, max_jobs=INGEST_MAX_JOBS, directory=INGEST_JOBS_DIR):
+        self.ingest = ingest
+        self.max_jobs = max_jobs
+        self.directory = directory or None
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, job, *args):
+        """Enregistre une tâche et la planifie ; retourne immédiatement."""
+        job.on_update = self._save
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._save(job)
+        self._executor.submit(self._run, job, *args)
+        return job
+
+    def status(self, job_id):
+        """Retourne l'état d'une tâche (exécutée par ce worker ou par un autre), ou None si elle est inconnue."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+
+        if self.directory is None or not job_id.isalnum():
+            return None
+        try:
+            with open(self._path(job_id), encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def _run(self, job, *args):
+        job.status = "running"
+        job.started_at = time.time()
+        self._save(job)
+        try:
+            job.result = self.ingest(job, *args)
+            job.status = "done"
+            job.status_code = 200
+        except IngestError as e:
+            job.status = "failed"
+            job.error = e.detail
+            job.status_code = e.status_code
+        except Exception as e:
+            job.status = "failed"
+            job.error = f"An error occurred: {str(e)}"
+            job.status_code = 500
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _save(self, job):
+        if self.directory is not None:
+            write_text(self._path(job.job_id), json.dumps(job.to_dict(), default=str))
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        while len(self._jobs) > self.max_jobs and finished:
+            job_id = finished.pop(0)
+            del self._jobs[job_id]
+            if self.directory is not None:
+                try:
+                    os.remove(self._path(job_id))
+                except FileNotFoundError:
+                    pass
@@ -1,15 +1,18 @@
-from app.utils import process_data, compute_metrics
+from app.utils import process_data, process_series, compute_metrics
 
-def oxygen_kpis(df_records):
+def oxygen_kpis(store, start=None, end=None, granularity=None):
     """Calcule les KPIs liés à la saturation en oxygène."""
     
     # Identifier spécifique à la fréquence cardiaque
     identifier = "HKQuantityTypeIdentifierOxygenSaturation"
     
     # Obtenir les moyennes journalières, hebdomadaires et mensuelles
-    daily_avg, weekly_avg, monthly_avg = process_data(df_records, identifier)
+    daily_avg, weekly_avg, monthly_avg = process_data(store, identifier, start, end)
 
     # Calculer les métriques globales
     overall_avg, overall_avg_ev = compute_metrics(daily_avg)
 
-    return daily_avg, weekly_avg, monthly_avg, overall_avg, overall_avg_ev
\ No newline at end of file
+    # Série à la granularité demandée, s'il y en a une
+    series = process_series(store, identifier, granularity, start, end)
+
+    return daily_avg, weekly_avg, monthly_avg, overall_avg, overall_avg_ev, series
\ No newline at end of file
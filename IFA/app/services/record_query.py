@@ -0,0 +1,146 @@
+import base64
+import binascii
+import pandas as pd
+from app.config import DATA_CHUNK_ROWS
+
+
+class QueryError(Exception):
+    """Paramètres de lecture des enregistrements invalides (colonne inconnue, curseur illisible ou périmé)."""
+
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def encode_cursor(version, position):
+    """Curseur opaque désignant la ligne `position` d'une version donnée du jeu de données."""
+    return base64.urlsafe_b64encode(f"{version}:{position}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, version):
+    """Retourne la position désignée par un curseur ; le curseur doit provenir de la même version des données."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        cursor_version, position = raw.rsplit(":", 1)
+        position = int(position)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise QueryError("Invalid cursor.")
+
+    if cursor_version != version:
+        raise QueryError("Cursor expired: the dataset was replaced since it was issued.", status_code=410)
+    return position
+
+
+def naive_timestamp(value):
+    """
+    Convertit une borne de date en Timestamp UTC sans fuseau, comme les dates des
+    enregistrements ; une borne sans fuseau est considérée comme déjà en UTC.
+    """
+    if value is None:
+        return None
+    value = pd.Timestamp(value)
+    return value.tz_convert("UTC").tz_localize(None) if value.tzinfo is not None else value
+
+
+def local_timestamp(value):
+    """
+    Convertit une borne de KPIs en Timestamp sans fuseau, à l'heure locale qu'elle
+    indique : les KPIs suivent le calendrier local des enregistrements.
+    """
+    if value is None:
+        return None
+    value = pd.Timestamp(value)
+    return value.tz_localize(None) if value.tzinfo is not None else value
+
+
+class RecordQuery:
+    """
+    Sélection d'enregistrements d'un jeu de données : types, intervalle de dates
+    (sur startDate, début inclus, fin exclue) et colonnes à renvoyer.
+
+    Les enregistrements sont parcourus par blocs de `chunk_rows` lignes, dans
+    l'ordre du jeu de données (regroupé par type) : la mémoire utilisée ne dépend
+    pas du nombre de lignes renvoyées.
+    """
+
+    def __init__(self, store, types=None, start=None, end=None, columns=None, chunk_rows=DATA_CHUNK_ROWS):
+        self.store = store
+        self.types = types
+        self.start = naive_timestamp(start)
+        self.end = naive_timestamp(end)
+        self.chunk_rows = chunk_rows
+
+        if columns:
+            unknown = [column for column in columns if column not in store.records.columns]
+            if unknown:
+                raise QueryError(f"Unknown columns: {', '.join(unknown)}.")
+        self.columns = list(columns) if columns else None
+
+    def ranges(self, after=0):
+        """Tranches [début, fin) du jeu de données à parcourir, à partir de la position `after`."""
+        if self.types:
+            bounds = sorted(self.store.partitions[t] for t in set(self.types) if t in self.store.partitions)
+        else:
+            bounds = [(0, len(self.store))]
+
+        return [(max(start, after), stop) for start, stop in bounds if stop > after]
+
+    def chunks(self, after=0):
+        """
+        Parcourt les enregistrements sélectionnés par blocs.
+
+        Produit des couples (bloc, position suivante) : la position suivante est celle
+        de la ligne qui suit le dernier enregistrement parcouru (pour un curseur).
+        """
+        records = self.store.records
+        for start, stop in self.ranges(after):
+            for position in range(start, stop, self.chunk_rows):
+                end = min(position + self.chunk_rows, stop)
+                chunk = records.iloc[position:end]
+
+                if self.start is not None or self.end is not None:
+                    mask = pd.Series(True, index=chunk.index)
+                    if self.start is not None:
+                        mask &= chunk["startDate"] >= self.start
+                    if self.end is not None:
+                        mask &= chunk["startDate"] < self.end
+                    chunk = chunk[mask]
+
+                if self.columns is not None:
+                    chunk = chunk[self.columns]
+
+                yield chunk, end
+
+    def page(self, cursor=None, limit=None):
+        """
+        Retourne une page d'au plus `limit` enregistrements à partir d'un curseur,
+        et le curseur de la page suivante (None s'il n'y a plus rien à lire).
+        """
+        after = decode_cursor(cursor, self.store.version) if cursor else 0
+        frames = []
+        count = 0
+
+        for chunk, end in self.chunks(after):
+            if limit is not None and count + len(chunk) >= limit:
+                # Couper le bloc à la dernière ligne de la page
+                chunk = chunk.iloc[:limit - count]
+                frames.append(chunk)
+                next_position = self.position_after(chunk, end)
+                more = bool(self.ranges(next_position))
+                return self.concat(frames), encode_cursor(self.store.version, next_position) if more else None
+
+            frames.append(chunk)
+            count += len(chunk)
+
+        return self.concat(frames), None
+
+    def position_after(self, chunk, end):
+        """Position qui suit la dernière ligne d'un bloc (l'index d'un jeu de données est sa position)."""
+        return int(chunk.index[-1]) + 1 if len(chunk) else end
+
+    def concat(self, frames):
+        if not frames:
+            columns = self.columns if self.columns is not None else self.store.records.columns
+            return self.store.records.iloc[0:0][list(columns)]
+        return pd.concat(frames) if len(frames) > 1 else frames[0]
@@ -0,0 +1,496 @@
+import uuid
+from datetime import datetime
+from functools import lru_cache
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+from pandas.api.types import union_categoricals
+
+
+# Colonnes de dates des enregistrements HealthKit
+DATE_COLUMNS = ["startDate", "endDate", "creationDate"]
+
+# Décalage horaire (minutes) de startDate : les dates sont en UTC, les KPIs suivent l'heure locale
+OFFSET_COLUMN = "startDateOffset"
+
+# Colonnes textuelles très répétitives, encodées sous forme de catégories
+CATEGORICAL_COLUMNS = ["type", "unit", "sourceName", "sourceVersion", "device", "value_text"]
+
+# Éléments enfants des <Record> (MetadataEntry...) : texte JSON en colonne Arrow, une chaîne par
+# enregistrement plutôt que des listes et dictionnaires Python ; décodé seulement à la sérialisation
+JSON_DTYPE = pd.ArrowDtype(pa.large_string())
+
+# Granularités pré-agrégées à l'upload (semaine ISO : du lundi au dimanche)
+ROLLUP_GRAINS = ["hour", "day", "week", "month"]
+
+# Agrégats conservés pour chaque période
+ROLLUP_COLUMNS = ["count", "sum", "min", "max", "sumsq"]
+
+
+@lru_cache(maxsize=None)
+def offset_minutes(text):
+    """Décalage horaire d'une date Apple Health ('+0100'), en minutes ; 0 s'il est absent ou illisible."""
+    try:
+        offset = datetime.strptime(text, "%z").utcoffset()
+    except ValueError:
+        return 0
+    return int(offset.total_seconds() // 60)
+
+
+def utc_offsets(series):
+    """
+    Décalage horaire (minutes, int16) de chaque date Apple Health ('2023-01-01 10:00:00 +0100').
+    Une date sans décalage, manquante ou déjà convertie sans fuseau a un décalage nul.
+    """
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        local = series.dt.tz_localize(None)
+        utc = series.dt.tz_convert("UTC").dt.tz_localize(None)
+        return ((local - utc) // pd.Timedelta(minutes=1)).fillna(0).astype("int16")
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.Series(0, index=series.index, dtype="int16")
+
+    # Peu de décalages distincts dans un export : chacun n'est lu qu'une fois
+    codes, suffixes = pd.factorize(series.str[20:])
+    minutes = np.array([offset_minutes(suffix) for suffix in suffixes] + [0], dtype="int16")
+    return pd.Series(minutes[codes], index=series.index)
+
+
+def parse_dates(series):
+    """
+    Convertit les dates Apple Health ('2023-01-01 10:00:00 +0100') en datetime64, en UTC.
+
+    Le décalage horaire de chaque date est appliqué (un export peut en mélanger
+    plusieurs, heure d'été et d'hiver) ; les dates sont ensuite conservées sans
+    fuseau, toutes en UTC. Une date sans décalage est considérée comme déjà en UTC.
+    Le décalage de startDate est gardé à part (OFFSET_COLUMN, voir utc_offsets).
+    """
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        return series.dt.tz_convert("UTC").dt.tz_localize(None)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+
+    dates = pd.to_datetime(series, format="%Y-%m-%d %H:%M:%S %z", errors="coerce", utc=True)
+    unparsed = dates.isna() & series.notna()
+    if unparsed.any():
+        dates[unparsed] = pd.to_datetime(series[unparsed], format="ISO8601", errors="coerce", utc=True)
+    return dates.dt.tz_localize(None)
+
+
+def is_json_column(series):
+    """Indique si une colonne contient le texte JSON d'éléments enfants des <Record>."""
+    return series.dtype == JSON_DTYPE
+
+
+def json_column(cells):
+    """Encode une colonne d'éléments enfants (listes de dictionnaires) en texte JSON."""
+    text = [orjson.dumps(cell).decode() if isinstance(cell, (list, dict)) else None for cell in cells]
+    return pd.Series(pd.arrays.ArrowExtensionArray(pa.array(text, type=pa.large_string())), index=cells.index)
+
+
+def is_nested(cells):
+    """Indique si une colonne brute contient des éléments enfants (listes de dictionnaires produites par le parsing)."""
+    if cells.dtype != object:
+        return False
+    valid = cells[cells.notna()]
+    return len(valid) > 0 and isinstance(valid.iloc[0], (list, dict))
+
+
+def coerce_record_types(df_records):
+    """Convertit les colonnes brutes (chaînes) d'enregistrements en colonnes typées."""
+
+    # Décalage horaire de startDate, lu avant sa conversion en UTC
+    if "startDate" in df_records and OFFSET_COLUMN not in df_records:
+        position = df_records.columns.get_loc("startDate") + 1
+        df_records.insert(position, OFFSET_COLUMN, utc_offsets(df_records["startDate"]))
+    elif OFFSET_COLUMN in df_records and df_records[OFFSET_COLUMN].dtype != "int16":
+        # Lots assemblés dont certains n'avaient pas de startDate
+        df_records[OFFSET_COLUMN] = df_records[OFFSET_COLUMN].fillna(0).astype("int16")
+
+    # Dates en datetime64
+    for column in DATE_COLUMNS:
+        if column in df_records:
+            df_records[column] = parse_dates(df_records[column])
+
+    # Valeurs en float64 ; les valeurs non numériques (catégories HealthKit, ex. sommeil) sont gardées dans value_text
+    if "value" in df_records and not pd.api.types.is_float_dtype(df_records["value"]):
+        raw = df_records["value"]
+        values = pd.to_numeric(raw, errors="coerce").astype("float64")
+        df_records["value_text"] = raw.where(values.isna() & raw.notna()).astype("object")
+        df_records["value"] = values
+
+    # Éléments enfants en texte JSON
+    for column in df_records.columns:
+        if is_nested(df_records[column]):
+            df_records[column] = json_column(df_records[column])
+
+    # Chaînes répétées (type, unité, source, appareil) en catégories
+    for column in CATEGORICAL_COLUMNS:
+        if column in df_records and not isinstance(df_records[column].dtype, pd.CategoricalDtype):
+            df_records[column] = df_records[column].astype("category")
+
+    return df_records
+
+
+def concat_record_batches(batches):
+    """Assemble des lots typés en un seul DataFrame sans perdre l'encodage en catégories."""
+
+    # Unifier les catégories de chaque colonne pour que la concaténation reste catégorielle
+    for column in CATEGORICAL_COLUMNS:
+        present = [batch[column] for batch in batches if column in batch]
+        if not present:
+            continue
+
+        categories = union_categoricals(present).categories
+        for batch in batches:
+            if column in batch:
+                batch[column] = batch[column].cat.set_categories(categories)
+
+    df_records = pd.concat(batches, ignore_index=True, sort=False)
+
+    # Les colonnes absentes de certains lots peuvent avoir perdu leur type
+    return coerce_record_types(df_records)
+
+
+def build_partitions(records):
+    """Calcule, pour des enregistrements triés par type, la tranche [début, fin) de chaque type."""
+    if "type" not in records or records.empty:
+        return {}
+
+    types = records["type"].cat.categories
+    codes = records["type"].cat.codes.to_numpy()
+
+    # Positions où le type change d'une ligne à la suivante
+    bounds = np.flatnonzero(np.diff(codes)) + 1
+    starts = np.concatenate(([0], bounds))
+    stops = np.concatenate((bounds, [len(codes)]))
+
+    # Les enregistrements sans type (code -1) ne forment pas de partition
+    return {
+        types[codes[start]]: (int(start), int(stop))
+        for start, stop in zip(starts, stops)
+        if codes[start] >= 0
+    }
+
+
+def local_start_dates(records):
+    """
+    Dates de début des enregistrements à l'heure locale de l'utilisateur (UTC + décalage).
+
+    Les KPIs suivent le calendrier local : un enregistrement du 1er janvier à 00:30
+    (+0100) compte pour le 1er janvier, pas pour le 31 décembre (UTC).
+    """
+    dates = records["startDate"]
+    if OFFSET_COLUMN not in records:
+        return dates
+    offsets = records[OFFSET_COLUMN].to_numpy().astype("timedelta64[m]")
+    return pd.Series(dates.to_numpy() + offsets, index=records.index, name="startDate")
+
+
+def period_start(dates, grain):
+    """
+    Retourne le début de la période contenant chaque date : heure, jour, semaine ISO,
+    mois, ou fenêtre de durée fixe donnée comme un alias pandas ("15min", "6h", "3D"...).
+    """
+    if grain == "hour":
+        return dates.dt.floor("h")
+
+    day = dates.dt.normalize()
+    if grain == "day":
+        return day
+    if grain == "week":
+        return day - pd.to_timedelta(day.dt.dayofweek, unit="D")
+    if grain == "month":
+        return pd.Series(dates.to_numpy().astype("datetime64[M]").astype("datetime64[ns]"), index=dates.index)
+
+    try:
+        return dates.dt.floor(grain)
+    except ValueError:
+        raise ValueError(f"Unknown granularity: {grain}")
+
+
+def is_period_start(timestamp, grain):
+    """Indique si une date est exactement le début d'une période de la granularité donnée."""
+    return period_start(pd.Series([timestamp]), grain).iloc[0] == timestamp
+
+
+def empty_rollup():
+    """Cube vide, retourné pour un type absent de l'export."""
+    return pd.DataFrame(
+        {
+            "count": pd.Series(dtype="int64"),
+            "sum": pd.Series(dtype="float64"),
+            "min": pd.Series(dtype="float64"),
+            "max": pd.Series(dtype="float64"),
+            "sumsq": pd.Series(dtype="float64"),
+        },
+        index=pd.DatetimeIndex([], name="period"),
+    )
+
+
+def build_rollups(records):
+    """
+    Pré-agrège les valeurs de chaque type à chaque granularité de ROLLUP_GRAINS.
+
+    Retourne {granularité: {type: DataFrame}} où chaque DataFrame est indexé par le
+    début de période et contient count, sum, min, max et sumsq (somme des carrés).
+    La moyenne d'une période vaut sum / count, la variance sumsq / count - moyenne².
+    """
+    if "type" not in records or records.empty:
+        return {grain: {} for grain in ROLLUP_GRAINS}
+
+    values = records["value"] if "value" in records else pd.Series(np.nan, index=records.index)
+    frame = pd.DataFrame({"type": records["type"], "value": values, "sumsq": values ** 2})
+
+    # Périodes du calendrier local (jours, semaines, mois de l'utilisateur)
+    dates = local_start_dates(records)
+    rollups = {}
+    for grain in ROLLUP_GRAINS:
+        frame["period"] = period_start(dates, grain)
+
+        # Un seul regroupement pour tous les types à cette granularité
+        cube = frame.groupby(["type", "period"], observed=True, sort=True).agg(
+            count=("value", "count"),
+            sum=("value", "sum"),
+            min=("value", "min"),
+            max=("value", "max"),
+            sumsq=("sumsq", "sum"),
+        )
+
+        rollups[grain] = {
+            identifier: group.droplevel("type")
+            for identifier, group in cube.groupby(level="type", observed=True)
+        }
+
+    return rollups
+
+
+def aggregate_periods(records, grain, by_type=False):
+    """
+    Cube (count, sum, min, max, sumsq) d'enregistrements d'un même type, par période de la granularité donnée.
+    Avec `by_type`, les enregistrements de plusieurs types sont regroupés en une fois, par (type, période).
+    """
+    if records.empty and not by_type:
+        return empty_rollup()
+
+    values = records["value"]
+    frame = pd.DataFrame({"value": values, "sumsq": values ** 2, "period": period_start(local_start_dates(records), grain)})
+    keys = ["period"]
+    if by_type:
+        frame["type"] = records["type"]
+        keys = ["type", "period"]
+    return frame.groupby(keys, observed=True, sort=True).agg(
+        count=("value", "count"),
+        sum=("value", "sum"),
+        min=("value", "min"),
+        max=("value", "max"),
+        sumsq=("sumsq", "sum"),
+    )
+
+
+def merge_rollups(rollups, delta):
+    """
+    Combine deux cubes d'agrégats (par exemple le cube existant et celui des nouveaux
+    enregistrements) : les comptes et sommes s'additionnent, min et max se combinent.
+    """
+    merged = {}
+    for grain in ROLLUP_GRAINS:
+        merged[grain] = dict(rollups.get(grain, {}))
+        for identifier, rollup in delta.get(grain, {}).items():
+            if identifier not in merged[grain]:
+                merged[grain][identifier] = rollup
+                continue
+
+            combined = pd.concat([merged[grain][identifier], rollup]).groupby(level="period", sort=True)
+            merged[grain][identifier] = combined.agg(
+                {"count": "sum", "sum": "sum", "min": "min", "max": "max", "sumsq": "sum"}
+            )[ROLLUP_COLUMNS]
+
+    return merged
+
+
+def rollup_mean(rollup):
+    """Moyenne de chaque période d'un cube (NaN pour une période sans valeur numérique)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return rollup["sum"].to_numpy() / rollup["count"].to_numpy()
+
+
+class RecordStore:
+    """
+    Enregistrements typés d'un export Apple Health, tels que conservés en cache.
+
+    Les dates sont en datetime64 (UTC, pour l'ordre et la reprise incrémentale) et
+    le décalage horaire de startDate est conservé (OFFSET_COLUMN) : le cube et les
+    intervalles de KPIs suivent l'heure locale de l'utilisateur. Les valeurs sont
+    en float64 (le texte des valeurs non numériques, comme les catégories de
+    sommeil, dans value_text) et les colonnes textuelles répétitives (type, unit,
+    sourceName, device...) en catégories : les services de KPIs consomment
+    directement ces colonnes sans reconvertir de chaînes.
+
+    Les enregistrements sont regroupés par type (tri stable, l'ordre du fichier est
+    conservé à l'intérieur d'un type) : chaque identifiant HealthKit occupe une
+    tranche contiguë, retrouvée en O(1) grâce à l'index des partitions.
+
+    Un cube d'agrégats (count, sum, min, max, sumsq) par type, à la granularité
+    horaire, journalière, hebdomadaire et mensuelle, est calculé une seule fois à
+    la construction : les KPIs sont ensuite lus directement dans ce cube.
+
+    Pour les requêtes sur un intervalle de dates, un index des dates de début triées
+    est construit par type à la première demande : les enregistrements de
+    l'intervalle sont retrouvés par recherche dichotomique.
+
+    `version` identifie le contenu du jeu de données (empreinte SHA-256 de l'export
+    uploadé) ; les résultats mis en cache pour une version ne servent qu'à elle.
+    """
+
+    def __init__(self, records, version=None):
+        records = coerce_record_types(records)
+        if "type" in records:
+            records = records.sort_values("type", kind="stable", ignore_index=True)
+
+        self.records = records
+        self.version = version or uuid.uuid4().hex
+        self.partitions = build_partitions(records)
+        self.rollups = build_rollups(records)
+        self._time_indexes = {}
+
+    @classmethod
+    def restore(cls, records, version, rollups):
+        """Reconstruit un jeu de données déjà préparé (typé, regroupé par type, cube calculé), sans recalcul."""
+        store = cls.__new__(cls)
+        store.records = records
+        store.version = version
+        store.partitions = build_partitions(records)
+        store.rollups = rollups
+        store._time_indexes = {}
+        return store
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def empty(self):
+        return self.records.empty
+
+    @property
+    def types(self):
+        """Identifiants HealthKit présents dans l'export."""
+        return list(self.partitions)
+
+    def records_for(self, identifier):
+        """Retourne la tranche (vue, sans copie) des enregistrements d'un type HealthKit donné."""
+        start, stop = self.partitions.get(identifier, (0, 0))
+        return self.records.iloc[start:stop]
+
+    def rollup(self, identifier, grain):
+        """Retourne le cube pré-agrégé d'un type HealthKit à la granularité demandée."""
+        if grain not in self.rollups:
+            raise ValueError(f"Unknown granularity: {grain}")
+        return self.rollups[grain].get(identifier, empty_rollup())
+
+    def time_index(self, identifier):
+        """
+        Retourne les dates de début (heure locale) triées des enregistrements d'un type
+        et leurs positions dans le jeu de données (les dates manquantes sont exclues).
+        """
+        index = self._time_indexes.get(identifier)
+        if index is None:
+            start, _ = self.partitions.get(identifier, (0, 0))
+            if "startDate" in self.records:
+                dates = local_start_dates(self.records_for(identifier)).to_numpy()
+            else:
+                dates = np.array([], dtype="datetime64[ns]")
+            valid = np.flatnonzero(~np.isnat(dates))
+            order = valid[np.argsort(dates[valid], kind="stable")]
+            index = (dates[order], order + start)
+            self._time_indexes[identifier] = index
+        return index
+
+    def records_between(self, identifier, start=None, end=None):
+        """Enregistrements d'un type dont la date de début (heure locale) est dans [start, end), dans l'ordre du fichier."""
+        if start is None and end is None:
+            return self.records_for(identifier)
+
+        dates, positions = self.time_index(identifier)
+        lo = 0 if start is None else np.searchsorted(dates, np.datetime64(start, "ns"), side="left")
+        hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(end, "ns"), side="left")
+        return self.records.take(np.sort(positions[lo:hi]))
+
+    def window_rollup(self, identifier, grain, start=None, end=None):
+        """
+        Retourne le cube d'un type sur [start, end) à la granularité demandée.
+
+        Le cube pré-agrégé est utilisé (et découpé par recherche dichotomique) quand
+        la granularité en fait partie et que les bornes tombent sur des débuts de
+        période ; sinon, seuls les enregistrements de l'intervalle sont agrégés.
+        """
+        if grain in self.rollups and all(bound is None or is_period_start(bound, grain) for bound in (start, end)):
+            rollup = self.rollup(identifier, grain)
+            if start is None and end is None:
+                return rollup
+            lo = 0 if start is None else rollup.index.searchsorted(start, side="left")
+            hi = len(rollup) if end is None else rollup.index.searchsorted(end, side="left")
+            return rollup.iloc[lo:hi]
+
+        return aggregate_periods(self.records_between(identifier, start, end), grain)
+
+    def window_rollups(self, identifiers, grain, start=None, end=None):
+        """
+        Retourne les cubes de plusieurs types sur [start, end), en une seule table indexée par (type, période).
+
+        Comme pour window_rollup, le cube pré-agrégé est découpé (en une fois pour
+        tous les types) quand les bornes tombent sur des débuts de période ; sinon,
+        les enregistrements de l'intervalle sont agrégés en un seul regroupement.
+        """
+        if grain in self.rollups and all(bound is None or is_period_start(bound, grain) for bound in (start, end)):
+            cube = pd.concat({identifier: self.rollup(identifier, grain) for identifier in identifiers}, names=["type"])
+            periods = cube.index.get_level_values("period")
+            keep = np.ones(len(cube), dtype=bool)
+            if start is not None:
+                keep &= periods >= start
+            if end is not None:
+                keep &= periods < end
+            return cube[keep]
+
+        records = pd.concat([self.records_between(identifier, start, end) for identifier in identifiers])
+        return aggregate_periods(records, grain, by_type=True)
+
+    def high_water_mark(self):
+        """Date de création du plus récent enregistrement ('AAAA-MM-JJ HH:MM:SS', en UTC), ou None."""
+        column = "creationDate" if "creationDate" in self.records else "startDate"
+        latest = self.records[column].max() if column in self.records else pd.NaT
+        return None if pd.isna(latest) else latest.strftime("%Y-%m-%d %H:%M:%S")
+
+    def extend(self, records, version=None):
+        """
+        Retourne un nouveau jeu de données complété par des enregistrements plus récents.
+
+        Le jeu de données courant n'est pas modifié (il peut encore être lu par
+        d'autres requêtes) ; seul le cube des nouveaux enregistrements est calculé,
+        puis fusionné avec le cube existant.
+        """
+        records = coerce_record_types(records)
+        if records.empty:
+            return RecordStore.restore(self.records, version or self.version, self.rollups)
+
+        merged = concat_record_batches([self.records.copy(deep=False), records])
+        merged = merged.sort_values("type", kind="stable", ignore_index=True)
+        rollups = merge_rollups(self.rollups, build_rollups(records))
+        return RecordStore.restore(merged, version or uuid.uuid4().hex, rollups)
+
+    def memory_usage(self):
+        """
+        Retourne l'empreinte mémoire du jeu de données, en octets : enregistrements (y
+        compris le texte JSON des colonnes imbriquées, compté dans ses tampons Arrow),
+        cube d'agrégats et index des dates, comptés pleins dès l'insertion en cache
+        même s'ils ne sont construits qu'à la première requête sur un intervalle.
+        """
+        records_bytes = self.records.memory_usage(deep=True).sum()
+        rollups_bytes = sum(
+            rollup.memory_usage(deep=True).sum() + rollup.index.nbytes
+            for rollups in self.rollups.values()
+            for rollup in rollups.values()
+        )
+        # Index des dates : une date (datetime64) et une position (int64) par enregistrement daté
+        time_index_bytes = 16 * int(self.records["startDate"].notna().sum()) if "startDate" in self.records else 0
+        return int(records_bytes + rollups_bytes + time_index_bytes)
@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+from app.config import RESULT_CACHE_MAX_ENTRIES
+
+
+class ResultCache:
+    """
+    Cache LRU des réponses déjà sérialisées des routes de KPIs.
+
+    Une entrée est indexée par (fichier, version du jeu de données, métrique,
+    paramètres de la requête) : un nouvel upload sous le même nom change la version
+    et ne peut donc jamais servir une réponse périmée.
+
+    Les versions compressées d'une réponse (gzip, brotli) sont gardées à côté de la
+    réponse brute : chaque encodage n'est calculé qu'une fois et disparaît avec elle.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(filename, version, metric, params=None):
+        """Construit la clé d'une réponse à partir du fichier, de sa version, de la métrique et des paramètres."""
+        return (filename, version, metric, tuple(sorted((params or {}).items())))
+
+    def get(self, key):
+        """Retourne la réponse sérialisée associée à la clé, ou None."""
+        with self._lock:
+            encodings = self._entries.get(key)
+            if encodings is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return encodings[None]
+
+    def put(self, key, payload):
+        """Enregistre une réponse sérialisée, en évinçant la moins récemment utilisée si besoin."""
+        with self._lock:
+            self._entries[key] = {None: payload}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return payload
+
+    def get_encoded(self, key, encoding):
+        """Retourne la réponse compressée avec cet encodage ("gzip", "br"), ou None."""
+        with self._lock:
+            encodings = self._entries.get(key)
+            return encodings.get(encoding) if encodings is not None else None
+
+    def put_encoded(self, key, encoding, body):
+        """Garde la réponse compressée à côté de la réponse brute (si celle-ci est toujours en cache)."""
+        with self._lock:
+            encodings = self._entries.get(key)
+            if encodings is not None:
+                encodings[encoding] = body
+        return body
+
+    def invalidate(self, filename):
+        """Supprime toutes les réponses calculées pour un fichier."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == filename]:
+                del self._entries[key]
+
+    def clear(self):
+        """Vide le cache (les compteurs sont conservés)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Retourne le nombre d'entrées, leur taille et les compteurs de hits / misses."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(len(body) for encodings in self._entries.values() for body in encodings.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Cache partagé par toutes les routes de KPIs
+result_cache = ResultCache()
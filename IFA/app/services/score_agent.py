@@ -1,5 +1,4 @@
 import os
-import xml.etree.ElementTree as ET
 import pandas as pd
 from langchain_community.tools import DuckDuckGoSearchResults
 from langchain.agents import Tool, AgentExecutor, create_react_agent
@@ -7,6 +6,8 @@ from langchain.prompts import PromptTemplate
 from langchain_community.agent_toolkits.load_tools import load_tools
 from langchain_ibm import ChatWatsonx
 from app.config import WATSONX_URL, WATSONX_PROJECT_ID, WATSONX_APIKEY
+from app.services.file_parser import extract_data
+from app.services.record_store import RecordStore
 
 
 """from dotenv import load_dotenv
@@ -17,31 +18,24 @@ WATSONX_URL = os.getenv('WATSONX_URL')
 WATSONX_PROJECT_ID = os.getenv('WATSONX_PROJECT_ID')
 WATSONX_APIKEY = os.getenv('WATSONX_APIKEY')"""
 
-def process_uploaded_file(uploaded_file) -> pd.DataFrame:
-    """Traite un fichier XML uploadé et extrait les données sous forme de DataFrame."""
+def process_uploaded_file(uploaded_file) -> RecordStore:
+    """Traite un fichier XML uploadé et extrait les enregistrements typés."""
 
-    tree = ET.parse(uploaded_file)
-    root = tree.getroot()
-    records = []
-    for record in root.findall(".//Record"):
-        records.append(record.attrib)
+    return RecordStore(extract_data(uploaded_file))
 
-    return pd.DataFrame(records)
+def extract_metric(store: RecordStore, metric_type: str) -> float:
+    """Extrait une métrique spécifique depuis les enregistrements typés."""
 
-def extract_metric(df_records: pd.DataFrame, metric_type: str) -> float:
-    """Extrait une métrique spécifique depuis le DataFrame."""
-
-    df_filtered = df_records[df_records['type'] == metric_type]
+    df_filtered = store.records_for(metric_type)
     if df_filtered.empty:
         return None
-    values = df_filtered['value'].astype(float)
 
-    return values.mean()
+    return df_filtered['value'].mean()
 
-def get_step_count_score(df_records: pd.DataFrame) -> str:
+def get_step_count_score(store: RecordStore) -> str:
     """Calculates the physical activity score based on step count."""
 
-    avg_steps = extract_metric(df_records, "HKQuantityTypeIdentifierStepCount")
+    avg_steps = extract_metric(store, "HKQuantityTypeIdentifierStepCount")
     if avg_steps is None:
         return "No step count data found."
     if avg_steps < 3000:
@@ -55,10 +49,10 @@ def get_step_count_score(df_records: pd.DataFrame) -> str:
 
     return f"Daily average step count: {avg_steps:.0f}\n Score: {score}"
 
-def get_heart_rate_score(df_records: pd.DataFrame) -> str:
+def get_heart_rate_score(store: RecordStore) -> str:
     """Calculates the score based on the latest recorded heart rate."""
 
-    latest_hr = extract_metric(df_records, "HKQuantityTypeIdentifierHeartRate")
+    latest_hr = extract_metric(store, "HKQuantityTypeIdentifierHeartRate")
     if latest_hr is None:
         return "No heart rate data found."
     if latest_hr < 50:
@@ -72,10 +66,10 @@ def get_heart_rate_score(df_records: pd.DataFrame) -> str:
 
     return f"Average Heart Rate: {latest_hr:.0f} BPM\n Score: {score}"
 
-def get_active_energy_score(df_records: pd.DataFrame) -> str:
+def get_active_energy_score(store: RecordStore) -> str:
     """Calculates the score based on active calories burned."""
 
-    latest_calories = extract_metric(df_records, "HKQuantityTypeIdentifierActiveEnergyBurned")
+    latest_calories = extract_metric(store, "HKQuantityTypeIdentifierActiveEnergyBurned")
     if latest_calories is None:
         return "No active energy data found."
     if latest_calories < 200:
@@ -89,10 +83,10 @@ def get_active_energy_score(df_records: pd.DataFrame) -> str:
 
     return f"Energy burned: {latest_calories:.0f} kcal\n Score: {score}"
 
-def get_spo2_score(df_records: pd.DataFrame) -> str:
+def get_spo2_score(store: RecordStore) -> str:
     """Calculates the score based on oxygen saturation (SpO₂)."""
 
-    avg_spo2 = extract_metric(df_records, "HKQuantityTypeIdentifierOxygenSaturation")
+    avg_spo2 = extract_metric(store, "HKQuantityTypeIdentifierOxygenSaturation")
     if avg_spo2 is None:
         return "No oxygen saturation data found."
     avg_spo2 *= 100  # Convert to percentage
@@ -165,7 +159,7 @@ agent_executor = AgentExecutor(
 )
 
 
-def analyze_health_data(df_records: pd.DataFrame) -> dict:
+def analyze_health_data(store: RecordStore) -> dict:
     """
     Analyse les données de santé à l'aide de l'agent IA et retourne uniquement les scores.
     Returns:
@@ -194,10 +188,10 @@ def analyze_health_data(df_records: pd.DataFrame) -> dict:
     scores = {}
 
     # Utiliser les outils pour obtenir les données brutes
-    steps_data = get_step_count_score(df_records)
-    heart_data = get_heart_rate_score(df_records)
-    energy_data = get_active_energy_score(df_records)
-    spo2_data = get_spo2_score(df_records)
+    steps_data = get_step_count_score(store)
+    heart_data = get_heart_rate_score(store)
+    energy_data = get_active_energy_score(store)
+    spo2_data = get_spo2_score(store)
 
     # Extraire uniquement la partie score de chaque métrique
     scores = {
@@ -0,0 +1,49 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Regroupe les calculs identiques lancés en même temps.
+
+    La première requête pour une clé lance le calcul ; les requêtes identiques
+    qui arrivent avant la fin attendent ce même calcul et reçoivent son résultat
+    (ou son erreur) au lieu de le refaire. Le calcul n'est pas annulé si l'une des
+    requêtes est abandonnée par son client.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._tasks = {}
+
+    async def do(self, key, fn, *args):
+        """Retourne le résultat de `await fn(*args)`, partagé avec les appels en cours ayant la même clé."""
+        task = self._tasks.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn(*args))
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Éviter l'avertissement "exception never retrieved" si toutes les requêtes ont été abandonnées
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        """Retourne le nombre de calculs lancés, de requêtes regroupées et de calculs en cours."""
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._tasks),
+        }
+
+
+# Regroupement partagé par toutes les routes
+single_flight = SingleFlight()
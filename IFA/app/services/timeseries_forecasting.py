@@ -4,27 +4,42 @@ import pandas as pd
 import numpy as np
 #import matplotlib.pyplot as plt
 from app.services.file_parser import extract_data
-from ibm_watsonx_ai.foundation_models import TSModelInference
-from ibm_watsonx_ai.foundation_models.schema import TSForecastParameters
-from app.services.watsonx_client import get_watsonx_client, get_watsonx_ts_model
+from app.services.record_store import RecordStore
+from app.services.forecast_engines import get_engine
+from app.services.forecast_cache import forecast_cache
+from app.config import FORECAST_ENGINE
 from sklearn.metrics import mean_absolute_percentage_error
 
+# Fenêtre de forecasting : 1536 heures de contexte, 96 heures prévues (et gardées pour le MAPE)
+TIMESTAMP_COLUMN = "date"
+TARGET_COLUMN = "target"
+CONTEXT_LENGTH = 1536
+FORECAST_HORIZON = 96
+FORECAST_FREQ = "1h"
+
+# Types bruités comme dans prepare_forecasting_data (±2 bpm) : fréquence cardiaque uniquement
+JITTER_TYPES = {"HKQuantityTypeIdentifierHeartRate"}
+
+# Intervalles physiques (min, max ; None = pas de borne) dans lesquels les prévisions sont ramenées
+PHYSICAL_RANGES = {
+    "HKQuantityTypeIdentifierHeartRate": (0.0, None),
+    "HKQuantityTypeIdentifierOxygenSaturation": (0.0, 1.0),
+    "HKQuantityTypeIdentifierRespiratoryRate": (0.0, None),
+    "HKQuantityTypeIdentifierHeartRateVariabilitySDNN": (0.0, None),
+}
+
 def load_timeseries_data(xml_file):
-    """Charge les données XML et les transforme en DataFrame de fréquence cardiaque."""
+    """Charge les données XML et les transforme en enregistrements typés."""
 
-    df_records = extract_data(xml_file) 
-    return df_records
+    store = RecordStore(extract_data(xml_file))
+    return store
 
-def process_heart_data(df_records):
-    """Transforme df_records pour extraire et formater les données de fréquence cardiaque."""
+def process_heart_data(store):
+    """Extrait et formate les données de fréquence cardiaque à la minute."""
     
-    df_hr = df_records[df_records['type'] == "HKQuantityTypeIdentifierHeartRate"].copy()
-    df_hr['startDate'] = pd.to_datetime(df_hr['startDate'])
-    df_hr['endDate'] = pd.to_datetime(df_hr['endDate'])
-    df_hr['value'] = pd.to_numeric(df_hr['value'], errors='coerce')
-    df_hr['duration'] = (df_hr['endDate'] - df_hr['startDate']).dt.total_seconds()
-    df_hr['minute'] = df_hr['startDate'].dt.floor('T')
-    df_hr_minute = df_hr.groupby('minute').agg({'value': 'mean'}).reset_index()
+    df_hr = store.records_for("HKQuantityTypeIdentifierHeartRate")
+    minute = df_hr['startDate'].dt.floor('T').rename('minute')
+    df_hr_minute = df_hr['value'].groupby(minute).mean().reset_index()
     df_hr_minute.rename(columns={'value': 'avg_bpm'}, inplace=True)
 
     return df_hr_minute
@@ -41,32 +56,91 @@ def prepare_forecasting_data(df_heart_rate_minute):
 
     return df
 
-def forecast_heart_rate(df):
-    """Effectue un forecasting sur la fréquence cardiaque à l'aide du modèle Watsonx."""
+def prepare_series_batch(store, identifiers):
+    """
+    Prépare en un seul passage les séries horaires (date, target) de plusieurs types
+    de données, comme process_heart_data puis prepare_forecasting_data pour chacun :
+    moyennes à la minute puis à l'heure calculées par un groupby (type, période)
+    commun, heures manquantes complétées par la valeur précédente. Seule la
+    fréquence cardiaque reçoit le bruit de prepare_forecasting_data : à cette
+    échelle (±2), il écraserait la SpO2 (fraction de 0 à 1) ou la variabilité.
+    """
+    identifiers = [identifier for identifier in identifiers if identifier in store.partitions]
+    if not identifiers:
+        return {}
 
-    timestamp_column = "date"
-    target_column = "target"
-    context_length = 1536
-    future_context = 96
-    
-    future_data = df.iloc[-future_context:,]
-    data = df.iloc[-(context_length + future_context):-future_context,]
-    
-    client = get_watsonx_client()
-    
-    ts_model_id = get_watsonx_ts_model(client)
-
-    ts_model = TSModelInference(
-        model_id=ts_model_id,
-        api_client=client
-    )
-    forecasting_params = TSForecastParameters(
-        timestamp_column=timestamp_column, 
-        freq="1h", 
-        target_columns=[target_column],
-    )
-    results = ts_model.forecast(data=data, params=forecasting_params)['results'][0]
-    
-    mape = mean_absolute_percentage_error(future_data[target_column], results[target_column]) * 100
-    
-    return results, mape
+    records = pd.concat([store.records_for(identifier)[['type', 'startDate', 'value']] for identifier in identifiers])
+    records = records[records['startDate'].notna()]
+    types = records['type'].astype(str)
+
+    minute = records['startDate'].dt.floor('T')
+    per_minute = records['value'].groupby([types, minute]).mean()
+    hour = per_minute.index.get_level_values(1).floor('H')
+    hourly = per_minute.groupby([per_minute.index.get_level_values(0), hour]).mean()
+
+    series = {}
+    for identifier, values in hourly.groupby(level=0):
+        values = values.droplevel(0)
+        hours = pd.date_range(values.index[0], values.index[-1], freq='H')
+        target = values.reindex(hours).ffill().to_numpy()
+        if identifier in JITTER_TYPES:
+            # Même bruit que prepare_forecasting_data (graine 42), sans toucher à l'état global de NumPy
+            target = target + np.random.RandomState(42).uniform(-2, 2, size=len(target))
+        # Dates ISO formatées par NumPy (même texte que strftime, bien plus rapide sur de longues séries)
+        dates = np.char.add(np.datetime_as_string(hours.to_numpy(), unit='s'), 'Z')
+        series[identifier] = pd.DataFrame({'date': dates, 'target': target})
+
+    return series
+
+def bound_forecast(values, bounds):
+    """Ramène les valeurs prévues dans un intervalle physique (min, max), si `bounds` est donné."""
+    values = np.asarray(values, dtype="float64")
+    if bounds is None:
+        return values
+    return np.clip(values, *bounds)
+
+def forecast_series_batch(series, engine=FORECAST_ENGINE, bounds=None):
+    """
+    Prévoit plusieurs séries préparées (date, target) : les séries déjà prévues sont
+    lues dans le cache, les autres sont envoyées ensemble au moteur (un seul appel
+    multi-séries). `bounds` donne l'intervalle physique de chaque série (voir
+    PHYSICAL_RANGES) : les valeurs prévues y sont ramenées avant le calcul du MAPE.
+    Retourne un couple (results, mape) par série, dans l'ordre.
+    """
+    ts_engine = get_engine(engine)
+    bounds = bounds or [None] * len(series)
+    outputs = [None] * len(series)
+    pending = []
+
+    for position, df in enumerate(series):
+        window = df.iloc[-(CONTEXT_LENGTH + FORECAST_HORIZON):,]
+        # Prévision déjà calculée pour cette fenêtre et ces paramètres : pas d'appel au moteur
+        key = forecast_cache.make_key(window, ts_engine.model_id, FORECAST_FREQ, CONTEXT_LENGTH, FORECAST_HORIZON,
+                                      bounds[position])
+        cached = forecast_cache.get(key)
+        if cached is not None:
+            outputs[position] = cached
+        else:
+            pending.append((position, key, window))
+
+    if pending:
+        contexts = [window.iloc[:-FORECAST_HORIZON,] for _, _, window in pending]
+        predictions = ts_engine.predict_many(contexts, TIMESTAMP_COLUMN, TARGET_COLUMN, FORECAST_FREQ, FORECAST_HORIZON)
+
+        for (position, key, window), results in zip(pending, predictions):
+            results = {**results, TARGET_COLUMN: bound_forecast(results[TARGET_COLUMN], bounds[position]).tolist()}
+            future_data = window.iloc[-FORECAST_HORIZON:,]
+            mape = mean_absolute_percentage_error(future_data[TARGET_COLUMN], results[TARGET_COLUMN]) * 100
+            outputs[position] = forecast_cache.put(key, results, mape)
+
+    return outputs
+
+def forecast_heart_rate(df, engine=FORECAST_ENGINE):
+    """
+    Effectue un forecasting sur la fréquence cardiaque avec le moteur demandé :
+    modèle Watsonx distant ou moteur local (ridge, saisonnier naïf).
+    Les 96 dernières heures sont prévues à partir des 1536 précédentes puis
+    comparées aux valeurs réelles (MAPE).
+    """
+
+    return forecast_series_batch([df], engine, [PHYSICAL_RANGES["HKQuantityTypeIdentifierHeartRate"]])[0]
@@ -1,24 +1,205 @@
-from ibm_watsonx_ai import Credentials
-from ibm_watsonx_ai import APIClient
-from app.config import WATSONX_APIKEY, WATSONX_URL, WATSONX_PROJECT_ID
+import random
+import threading
+import time
+import httpx
+from app.config import (
+    WATSONX_APIKEY,
+    WATSONX_URL,
+    WATSONX_PROJECT_ID,
+    WATSONX_IAM_URL,
+    WATSONX_API_VERSION,
+    WATSONX_TIMEOUT_SECONDS,
+    WATSONX_CONNECT_TIMEOUT_SECONDS,
+    WATSONX_MAX_RETRIES,
+    WATSONX_BACKOFF_SECONDS,
+    WATSONX_MAX_CONNECTIONS,
+    WATSONX_STUB,
+)
+
+# Modèle de forecasting Granite TinyTimeMixer (contexte de 1536 points, horizon de 96)
+TS_MODEL_ID = "ibm/granite-ttm-1536-96-r2"
+
+# Le jeton IAM est renouvelé quand il lui reste moins de cette durée (secondes)
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+
+# Réponses à réessayer : limitation de débit et erreurs transitoires du service
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Attente maximale entre deux tentatives (secondes)
+MAX_BACKOFF_SECONDS = 30.0
+
+# Adresse du service factice quand WATSONX_URL n'est pas renseignée
+STUB_URL = "http://watsonx.stub"
+
+
+class WatsonxError(Exception):
+    """Échec d'un appel à Watsonx après épuisement des tentatives."""
+
+    def __init__(self, detail, status_code=None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class WatsonxClient:
+    """
+    Client REST Watsonx partagé par le processus.
+
+    Rien n'est fait à la construction : la connexion HTTP est ouverte au premier
+    appel et gardée (keep-alive, `max_connections` connexions au plus). Le jeton IAM
+    est obtenu une fois puis réutilisé jusqu'à peu avant son expiration ; un 401
+    force son renouvellement. Chaque appel a un délai de connexion et de lecture,
+    et les erreurs transitoires (réseau, 429, 5xx) sont réessayées avec un backoff
+    exponentiel à jitter complet, en respectant Retry-After.
+
+    En mode `stub`, les requêtes sont servies localement par un faux service
+    Watsonx (watsonx_stub) : tout le chemin de forecasting fonctionne hors ligne.
+    """
+
+    def __init__(self, url=WATSONX_URL, api_key=WATSONX_APIKEY, project_id=WATSONX_PROJECT_ID, iam_url=WATSONX_IAM_URL,
+                 api_version=WATSONX_API_VERSION, timeout=WATSONX_TIMEOUT_SECONDS,
+                 connect_timeout=WATSONX_CONNECT_TIMEOUT_SECONDS, max_retries=WATSONX_MAX_RETRIES,
+                 backoff=WATSONX_BACKOFF_SECONDS, max_connections=WATSONX_MAX_CONNECTIONS, stub=WATSONX_STUB):
+        self.url = (url or (STUB_URL if stub else "")).rstrip("/")
+        self.api_key = api_key
+        self.project_id = project_id
+        self.iam_url = iam_url
+        self.api_version = api_version
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self.stub = stub
+        self._http = None
+        self._token = None
+        self._token_expires_at = 0.0
+        self._lock = threading.Lock()
+        self._token_lock = threading.Lock()
+
+    @property
+    def http(self):
+        with self._lock:
+            if self._http is None:
+                transport = None
+                if self.stub:
+                    from app.services.watsonx_stub import stub_transport
+                    transport = stub_transport()
+                self._http = httpx.Client(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                    transport=transport,
+                )
+            return self._http
+
+    def token(self, refresh=False):
+        """Jeton IAM en cours de validité, renouvelé s'il expire bientôt (ou si `refresh`)."""
+        # Un seul renouvellement à la fois : les autres threads attendent puis réutilisent le nouveau jeton
+        with self._token_lock:
+            if not refresh and self._token is not None and time.time() < self._token_expires_at - TOKEN_REFRESH_MARGIN_SECONDS:
+                return self._token
+
+            response = self._send(
+                "POST", self.iam_url,
+                data={"grant_type": "urn:ibm:params:oauth:grant-type:apikey", "apikey": self.api_key},
+                headers={"Accept": "application/json"},
+            )
+            # _send laisse passer les 401 (renouvellement du jeton) : ici, c'est la clé d'API qui est refusée
+            if response.status_code == 401:
+                raise WatsonxError(f"Watsonx IAM rejected the API key: {response.text}", status_code=401)
+            payload = response.json()
+            if "access_token" not in payload:
+                raise WatsonxError(f"Watsonx IAM returned no access token: {response.text}")
+
+            self._token = payload["access_token"]
+            self._token_expires_at = payload.get("expiration") or time.time() + payload.get("expires_in", 3600)
+            return self._token
+
+    def request(self, method, path, **kwargs):
+        """Appel authentifié à l'API Watsonx ; le jeton est renouvelé une fois si le service le refuse (401)."""
+        url = f"{self.url}{path}"
+        params = {"version": self.api_version, **kwargs.pop("params", {})}
+
+        response = self._send(method, url, params=params, headers={"Authorization": f"Bearer {self.token()}"}, **kwargs)
+        if response.status_code == 401:
+            token = self.token(refresh=True)
+            response = self._send(method, url, params=params, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+
+        if response.status_code == 401:
+            raise WatsonxError("Watsonx rejected the credentials.", status_code=401)
+        return response.json()
+
+    def _send(self, method, url, **kwargs):
+        """Envoie une requête en réessayant les erreurs transitoires ; lève WatsonxError sur un échec définitif."""
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = self.http.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                error = WatsonxError(f"Watsonx request failed: {e}")
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    if response.status_code >= 400 and response.status_code != 401:
+                        raise WatsonxError(f"Watsonx error {response.status_code}: {response.text}", response.status_code)
+                    return response
+                error = WatsonxError(f"Watsonx error {response.status_code}: {response.text}", response.status_code)
+                retry_after = response.headers.get("retry-after")
+
+            if attempt == self.max_retries:
+                raise error
+
+            # Backoff exponentiel à jitter complet, ou délai imposé par le service
+            delay = random.uniform(0, min(MAX_BACKOFF_SECONDS, self.backoff * 2 ** attempt))
+            if retry_after is not None and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            time.sleep(delay)
+
+    def forecast(self, data, model_id, timestamp_column, target_columns, freq, prediction_length=None, id_columns=None):
+        """
+        Prévision d'une série (DataFrame) par un modèle de time series ; retourne la réponse du service.
+        Avec `id_columns`, `data` contient plusieurs séries, prévues dans la même requête.
+        """
+        schema = {"timestamp_column": timestamp_column, "freq": freq, "target_columns": list(target_columns)}
+        if id_columns:
+            schema["id_columns"] = list(id_columns)
+        body = {
+            "model_id": model_id,
+            "project_id": self.project_id,
+            "data": {column: data[column].tolist() for column in data.columns},
+            "schema": schema,
+        }
+        if prediction_length is not None:
+            body["parameters"] = {"prediction_length": prediction_length}
+        return self.request("POST", "/ml/v1/time_series/forecast", json=body)
+
+    def close(self):
+        with self._lock:
+            if self._http is not None:
+                self._http.close()
+                self._http = None
+
+
+_client = None
+_client_lock = threading.Lock()
 
 
-# Initialisation des credentials Watsonx
 def get_watsonx_client():
-    """Retourne une instance du client IBM Watsonx."""
-    credentials = Credentials(
-        url=WATSONX_URL,
-        api_key=WATSONX_APIKEY
-    )
+    """Retourne le client Watsonx du processus (créé au premier appel, puis réutilisé)."""
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            _client = WatsonxClient()
+        return _client
 
-    client = APIClient(credentials)
-    client.set.default_project(WATSONX_PROJECT_ID)
 
-    return client
+def close_watsonx_client():
+    """Ferme les connexions du client Watsonx du processus, s'il a été créé."""
+    with _client_lock:
+        if _client is not None:
+            _client.close()
 
 
 # Initialisation du modèle de forecasting
 def get_watsonx_ts_model(client):
-    """Retourne une instance du modèle Watsonx Time Series."""
-    ts_model_id = client.foundation_models.TimeSeriesModels.GRANITE_TTM_1536_96_R2
-    return ts_model_id
\ No newline at end of file
+    """Retourne l'identifiant du modèle Watsonx Time Series."""
+    return TS_MODEL_ID
@@ -0,0 +1,64 @@
+import time
+import httpx
+import numpy as np
+import orjson
+import pandas as pd
+
+# Saisonnalité utilisée par les prévisions factices (24 points : un jour de données horaires)
+STUB_SEASON = 24
+
+# Horizon par défaut, comme GRANITE_TTM_1536_96_R2
+STUB_PREDICTION_LENGTH = 96
+
+
+def stub_series_forecast(data, schema, horizon):
+    """Prévision factice d'une série : la dernière saison de chaque cible est répétée sur l'horizon."""
+    timestamps = pd.to_datetime(pd.Series(data[schema["timestamp_column"]]))
+    dates = pd.date_range(timestamps.iloc[-1], periods=horizon + 1, freq=pd.Timedelta(schema["freq"]))[1:]
+
+    result = {schema["timestamp_column"]: dates.strftime("%Y-%m-%dT%H:%M:%SZ").tolist()}
+    for column in schema["target_columns"]:
+        values = np.asarray(data[column], dtype="float64")
+        season = values[-STUB_SEASON:]
+        result[column] = np.resize(season, horizon).tolist()
+    return result
+
+
+def stub_forecast(body):
+    """Prévision factice saisonnière naïve, série par série si la requête en contient plusieurs (id_columns)."""
+    schema = body["schema"]
+    horizon = body.get("parameters", {}).get("prediction_length", STUB_PREDICTION_LENGTH)
+    id_columns = schema.get("id_columns") or []
+    frame = pd.DataFrame(body["data"])
+
+    if not id_columns:
+        return {"model_id": body["model_id"], "results": [stub_series_forecast(frame, schema, horizon)]}
+
+    results = []
+    for ids, series in frame.groupby(id_columns, sort=False):
+        result = stub_series_forecast(series, schema, horizon)
+        ids = ids if isinstance(ids, tuple) else (ids,)
+        results.append(pd.DataFrame({**dict(zip(id_columns, ids)), **result}))
+    return {"model_id": body["model_id"], "results": [pd.concat(results).to_dict(orient="list")]}
+
+
+def stub_handler(request):
+    """Répond comme le service IAM et l'API de time series de Watsonx, sans réseau."""
+    if request.url.path.endswith("/identity/token"):
+        return httpx.Response(200, json={
+            "access_token": "stub-token",
+            "expires_in": 3600,
+            "expiration": int(time.time()) + 3600,
+        })
+
+    if request.url.path.endswith("/ml/v1/time_series/forecast"):
+        if request.headers.get("authorization") != "Bearer stub-token":
+            return httpx.Response(401, json={"errors": [{"code": "authentication_token_not_valid"}]})
+        return httpx.Response(200, json=stub_forecast(orjson.loads(request.read())))
+
+    return httpx.Response(404, json={"errors": [{"code": "not_found", "message": request.url.path}]})
+
+
+def stub_transport():
+    """Transport HTTP servant les appels Watsonx localement (mode WATSONX_STUB)."""
+    return httpx.MockTransport(stub_handler)
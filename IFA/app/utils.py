@@ -1,32 +1,54 @@
 import pandas as pd
+from app.services.record_store import rollup_mean
 
-def process_data(df_records, identifier):
-    """Transforme df_records et calcule les moyennes journalières, hebdomadaires et mensuelles pour un type de donnée spécifique."""
-    
-    # Filtrer uniquement les enregistrements correspondant à l'identifiant spécifié
-    df_filtered = df_records[df_records['type'] == identifier].copy()
+# Moyennes par période retournées pour chaque type : (granularité, colonne de la période, colonne de la moyenne)
+PERIOD_AVERAGES = (("day", "day", "daily_avg"), ("week", "week", "weekly_avg"), ("month", "month", "monthly_avg"))
 
-    # Conversion des dates en format datetime
-    df_filtered['startDate'] = pd.to_datetime(df_filtered['startDate'])
-    df_filtered['endDate'] = pd.to_datetime(df_filtered['endDate'])
+def process_data(store, identifier, start=None, end=None):
+    """
+    Retourne les moyennes journalières, hebdomadaires et mensuelles d'un type de donnée,
+    lues dans le cube pré-agrégé (limitées à [start, end) si ces bornes sont précisées).
+    """
+    
+    # Cubes pré-calculés à l'upload pour l'identifiant spécifié
+    daily = store.window_rollup(identifier, 'day', start, end)
+    weekly = store.window_rollup(identifier, 'week', start, end)
+    monthly = store.window_rollup(identifier, 'month', start, end)
 
-    # Conversion des valeurs en float
-    df_filtered['value'] = pd.to_numeric(df_filtered['value'], errors='coerce')
+    # Moyennes par période (sum / count)
+    daily_avg = pd.DataFrame({'day': daily.index.date, 'daily_avg': rollup_mean(daily)})
+    weekly_avg = pd.DataFrame({'week': weekly.index.to_period('W').astype(str), 'weekly_avg': rollup_mean(weekly)})
+    monthly_avg = pd.DataFrame({'month': monthly.index.to_period('M').astype(str), 'monthly_avg': rollup_mean(monthly)})
 
-    # Ajouter les colonnes de date (jour, semaine, mois)
-    df_filtered['day'] = df_filtered['startDate'].dt.date
-    df_filtered['week'] = df_filtered['startDate'].dt.to_period('W').astype(str)
-    df_filtered['month'] = df_filtered['startDate'].dt.to_period('M').astype(str)
+    return daily_avg, weekly_avg, monthly_avg
 
-    # Calcul des moyennes
-    daily_avg = df_filtered.groupby('day')['value'].mean().reset_index().rename(columns={'value': 'daily_avg'})
-    weekly_avg = df_filtered.groupby('week')['value'].mean().reset_index().rename(columns={'value': 'weekly_avg'})
-    monthly_avg = df_filtered.groupby('month')['value'].mean().reset_index().rename(columns={'value': 'monthly_avg'})
+def process_series(store, identifier, granularity=None, start=None, end=None):
+    """
+    Retourne la série d'un type de donnée à la granularité demandée (hour, day, week,
+    month ou fenêtre fixe comme "15min"), sur [start, end) : début de période, moyenne,
+    minimum, maximum et nombre de valeurs. Retourne None sans granularité.
+    """
+    if granularity is None:
+        return None
 
-    return daily_avg, weekly_avg, monthly_avg
+    rollup = store.window_rollup(identifier, granularity, start, end)
+    return pd.DataFrame({
+        'period': rollup.index,
+        'avg': rollup_mean(rollup),
+        'min': rollup['min'].to_numpy(),
+        'max': rollup['max'].to_numpy(),
+        'count': rollup['count'].to_numpy(),
+    })
 
 def compute_metrics(df_avg):
-    """Calcule les moyennes globales et les évolutions des valeurs journalières."""
+    """
+    Calcule les moyennes globales et les évolutions des valeurs journalières.
+    Sans aucune journée (intervalle [start, end) sans enregistrement), les métriques globales valent None.
+    """
+    
+    if df_avg.empty:
+        df_avg['evolution'] = pd.Series(dtype='float64')
+        return None, None
     
     overall_avg = df_avg.iloc[:, 1].sum() / df_avg.iloc[:, 0].count()
     
@@ -37,3 +59,54 @@ def compute_metrics(df_avg):
     overall_avg_ev = df_avg['evolution'].sum() / df_avg.iloc[:, 0].count()
     
     return overall_avg, overall_avg_ev
+
+def split_by_type(frame, identifiers):
+    """Découpe une table de plusieurs types (colonne "type") en une table par type ; vide pour un type absent."""
+    groups = {
+        identifier: group.drop(columns="type").reset_index(drop=True)
+        for identifier, group in frame.groupby("type", observed=True, sort=False)
+    }
+    empty = frame.iloc[0:0].drop(columns="type").reset_index(drop=True)
+    return {identifier: groups[identifier] if identifier in groups else empty.copy() for identifier in identifiers}
+
+def compute_kpis_batch(store, identifiers, start=None, end=None, granularity=None):
+    """
+    Calcule en un seul appel les KPIs (moyennes par période et métriques globales) de plusieurs types de données.
+
+    Chaque granularité est lue en un seul découpage du cube de tous les types
+    (RecordStore.window_rollups), puis répartie par type ; les résultats sont ceux
+    de process_data, compute_metrics et process_series pour chaque type.
+    Un type absent de l'export (VO2Max...) a des périodes vides et des métriques globales à None.
+    """
+    identifiers = list(dict.fromkeys(identifiers))
+
+    averages = []
+    for grain, period_column, avg_column in PERIOD_AVERAGES:
+        cube = store.window_rollups(identifiers, grain, start, end)
+        periods = pd.DatetimeIndex(cube.index.get_level_values("period"))
+        labels = periods.date if grain == "day" else periods.to_period("W" if grain == "week" else "M").astype(str)
+        frame = pd.DataFrame({"type": cube.index.get_level_values("type"), period_column: labels, avg_column: rollup_mean(cube)})
+        averages.append(split_by_type(frame, identifiers))
+
+    series = dict.fromkeys(identifiers)
+    if granularity is not None:
+        cube = store.window_rollups(identifiers, granularity, start, end)
+        series = split_by_type(pd.DataFrame({
+            'type': cube.index.get_level_values("type"),
+            'period': cube.index.get_level_values("period"),
+            'avg': rollup_mean(cube),
+            'min': cube['min'].to_numpy(),
+            'max': cube['max'].to_numpy(),
+            'count': cube['count'].to_numpy(),
+        }), identifiers)
+
+    kpis = {}
+    for identifier in identifiers:
+        daily_avg, weekly_avg, monthly_avg = (by_type[identifier] for by_type in averages)
+        if identifier in store.partitions:
+            overall_avg, overall_avg_ev = compute_metrics(daily_avg)
+        else:
+            overall_avg, overall_avg_ev = None, None
+        kpis[identifier] = (daily_avg, weekly_avg, monthly_avg, overall_avg, overall_avg_ev, series[identifier])
+    
+    return kpis
\ No newline at end of file
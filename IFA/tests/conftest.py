@@ -0,0 +1,55 @@
+import os
+
+# Configuration des tests : ni cache disque ni pool de processus, Watsonx simulé localement
+os.environ.update({
+    "DISK_CACHE_DIR": "",
+    "INGEST_JOBS_DIR": "",
+    "FORECAST_CACHE_DIR": "",
+    "COMPUTE_EXECUTOR": "thread",
+    "WATSONX_STUB": "1",
+})
+
+from datetime import datetime, timedelta
+from xml.sax.saxutils import quoteattr
+import pytest
+
+
+def apple_date(local, offset="+0100"):
+    """Date au format des exports Apple Health ('2024-01-01 00:30:00 +0100')."""
+    return f"{local:%Y-%m-%d %H:%M:%S} {offset}"
+
+
+def heart_rate_records(start, count, step_minutes=37, offset="+0100", identifier="HKQuantityTypeIdentifierHeartRate"):
+    """Enregistrements réguliers (heure locale `start`, un toutes les `step_minutes` minutes) aux valeurs variées."""
+    records = []
+    for position in range(count):
+        local = start + timedelta(minutes=step_minutes * position)
+        records.append({
+            "type": identifier,
+            "sourceName": "Watch",
+            "unit": "count/min",
+            "creationDate": apple_date(local + timedelta(seconds=5), offset),
+            "startDate": apple_date(local, offset),
+            "endDate": apple_date(local + timedelta(minutes=1), offset),
+            "value": f"{60 + (position * 7) % 41 + (position % 3) * 0.25:g}",
+        })
+    return records
+
+
+def write_export(path, records):
+    """Écrit un export Apple Health minimal (<HealthData> et ses <Record>) ; retourne son chemin."""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<HealthData locale="en_US">']
+    for record in records:
+        attributes = " ".join(f"{name}={quoteattr(str(value))}" for name, value in record.items())
+        lines.append(f" <Record {attributes}/>")
+    lines.append("</HealthData>")
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def fixed_offset_export(tmp_path):
+    """Export dont toutes les dates sont en +0100, commençant le 1er janvier 2024 à 00:10 (heure locale)."""
+    records = heart_rate_records(datetime(2024, 1, 1, 0, 10), 4000)
+    records += heart_rate_records(datetime(2024, 1, 1, 0, 20), 900, step_minutes=95, identifier="HKQuantityTypeIdentifierOxygenSaturation")
+    return write_export(tmp_path / "export.xml", records)
@@ -0,0 +1,78 @@
+import pytest
+from app.services.dataset_cache import DatasetCache, CacheBudgetError
+
+
+class FakeStore:
+    """Jeu de données réduit à ce que le cache utilise : une version et une taille."""
+
+    def __init__(self, version, size):
+        self.version = version
+        self.size = size
+
+    def memory_usage(self):
+        return self.size
+
+
+def test_bytes_follow_inserts_replacements_and_deletes():
+    removed = []
+    cache = DatasetCache(max_bytes=1000, ttl_seconds=0, on_remove=removed.append)
+
+    cache["a.xml"] = FakeStore("v1", 300)
+    cache["b.xml"] = FakeStore("v2", 200)
+    assert cache.bytes == 500
+
+    # Remplacement : l'ancienne taille est retirée, l'ancien fichier notifié
+    cache["a.xml"] = FakeStore("v3", 100)
+    assert cache.bytes == 300
+    assert removed == ["a.xml"]
+
+    assert cache.delete("b.xml")
+    assert not cache.delete("b.xml")
+    assert cache.bytes == 100
+    assert cache.stats()["files"] == {"a.xml": 100}
+
+
+def test_least_recently_used_files_are_evicted_first():
+    cache = DatasetCache(max_bytes=1000, ttl_seconds=0)
+    cache["a.xml"] = FakeStore("v1", 400)
+    cache["b.xml"] = FakeStore("v2", 400)
+
+    # a.xml est relu : b.xml devient le moins récemment utilisé
+    assert cache.get("a.xml").version == "v1"
+    cache["c.xml"] = FakeStore("v3", 400)
+
+    assert cache.get("b.xml") is None
+    assert cache.get("a.xml") is not None and cache.get("c.xml") is not None
+    assert cache.bytes == 800
+    assert cache.stats()["evictions"] == 1
+
+
+def test_files_of_the_same_version_share_one_dataset():
+    cache = DatasetCache(max_bytes=1000, ttl_seconds=0)
+    store = FakeStore("v1", 600)
+    cache["monday.xml"] = store
+    cache["copy.xml"] = FakeStore("v1", 600)
+
+    # Un seul jeu de données en mémoire, compté une fois
+    assert cache.get("copy.xml") is store
+    assert cache.bytes == 600
+    assert cache.stats()["datasets"] == 1
+
+    # Il reste compté tant qu'un fichier y renvoie
+    cache.delete("monday.xml")
+    assert cache.bytes == 600
+    cache.delete("copy.xml")
+    assert cache.bytes == 0
+    assert cache.stats()["datasets"] == 0
+
+
+def test_dataset_larger_than_the_budget_is_refused():
+    cache = DatasetCache(max_bytes=1000, ttl_seconds=0)
+    cache["a.xml"] = FakeStore("v1", 400)
+
+    with pytest.raises(CacheBudgetError):
+        cache["huge.xml"] = FakeStore("v2", 1001)
+
+    # Le cache est inchangé
+    assert cache.get("a.xml") is not None
+    assert cache.bytes == 400
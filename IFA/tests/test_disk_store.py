@@ -0,0 +1,63 @@
+from datetime import datetime
+import os
+import pandas as pd
+import pytest
+from app.services.dataset_cache import DatasetCache
+from app.services.disk_store import DiskStore, encode_name, decode_name
+from app.services.file_parser import extract_data
+from app.services.record_store import RecordStore
+from conftest import heart_rate_records, write_export
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = write_export(tmp_path / "export.xml", heart_rate_records(datetime(2024, 1, 1), 200))
+    return RecordStore(extract_data(str(path)), version="v1")
+
+
+@pytest.mark.parametrize("filename", ["export.xml", ".", "..", "", ".hidden", "a/b.xml"])
+def test_names_stay_inside_the_names_directory(tmp_path, store, filename):
+    disk = DiskStore(str(tmp_path / "cache"))
+    assert decode_name(encode_name(filename)) == filename
+
+    disk.save(filename, store)
+
+    assert os.path.isfile(disk._name_path(filename))
+    assert disk.filenames() == [filename]
+    assert disk.version_of(filename) == "v1"
+
+
+def test_unknown_dot_names_are_missing(tmp_path):
+    cache = DatasetCache(backend=DiskStore(str(tmp_path / "cache")))
+
+    assert cache.get(".") is None
+    assert cache.get("..") is None
+    assert not cache.delete("..")
+
+
+def test_saved_dataset_round_trips(tmp_path, store):
+    disk = DiskStore(str(tmp_path / "cache"))
+    disk.save("export.xml", store)
+
+    loaded = disk.load("export.xml")
+
+    pd.testing.assert_frame_equal(loaded.records, store.records, check_exact=True)
+    pd.testing.assert_frame_equal(
+        loaded.rollup("HKQuantityTypeIdentifierHeartRate", "day"),
+        store.rollup("HKQuantityTypeIdentifierHeartRate", "day"),
+        check_dtype=False,
+    )
+    # Aucun répertoire temporaire ne reste après l'écriture
+    assert os.listdir(disk.datasets_dir) == ["v1"]
+
+
+def test_replaced_dataset_is_collected(tmp_path, store):
+    disk = DiskStore(str(tmp_path / "cache"))
+    disk.save("export.xml", store)
+    disk.save("copy.xml", store)
+
+    disk.save("export.xml", RecordStore(store.records, version="v2"))
+    assert sorted(os.listdir(disk.datasets_dir)) == ["v1", "v2"]
+
+    disk.delete("copy.xml")
+    assert os.listdir(disk.datasets_dir) == ["v2"]
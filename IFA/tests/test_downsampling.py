@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+from app.services.downsampling import lttb, min_max, downsample_frame
+
+
+def test_lttb_keeps_the_ends_and_at_most_max_points():
+    x = np.arange(1000, dtype="float64")
+    y = np.sin(x / 25)
+
+    positions = lttb(x, y, 100)
+
+    assert len(positions) == 100
+    assert positions[0] == 0 and positions[-1] == 999
+    assert np.all(np.diff(positions) > 0)
+
+
+def test_lttb_keeps_an_isolated_peak():
+    x = np.arange(500, dtype="float64")
+    y = np.zeros(500)
+    y[333] = 50.0
+
+    assert 333 in lttb(x, y, 20)
+
+
+def test_lttb_leaves_short_series_untouched():
+    x = np.arange(10, dtype="float64")
+    assert lttb(x, x, 50).tolist() == list(range(10))
+    assert lttb(x, x, 2).tolist() == list(range(10))
+
+
+def test_min_max_keeps_every_bucket_extreme():
+    values = np.random.default_rng(0).normal(size=2000)
+    positions = min_max(values, 50)
+
+    assert len(positions) <= 50
+    assert values.argmin() in positions and values.argmax() in positions
+
+
+def test_downsample_frame_uses_the_period_axis():
+    periods = pd.date_range("2024-01-01", periods=400, freq="h")
+    frame = pd.DataFrame({"period": periods, "avg": np.cos(np.arange(400) / 10), "min": 0.0, "max": 1.0})
+
+    reduced = downsample_frame(frame, 40)
+
+    assert len(reduced) == 40
+    assert list(reduced.columns) == list(frame.columns)
+    assert reduced["period"].iloc[0] == periods[0] and reduced["period"].iloc[-1] == periods[-1]
+    assert reduced["period"].is_monotonic_increasing
+    assert downsample_frame(frame, 1000) is frame
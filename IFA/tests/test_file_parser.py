@@ -0,0 +1,91 @@
+from datetime import datetime
+import json
+import pandas as pd
+import pytest
+from app.routes.cache_handler import cache, load_upload
+from app.services.file_parser import extract_data
+from app.services.record_store import RecordStore
+from conftest import heart_rate_records, write_export
+
+HEART_RATE = "HKQuantityTypeIdentifierHeartRate"
+
+
+def test_batches_do_not_change_the_result(fixed_offset_export):
+    whole = extract_data(str(fixed_offset_export))
+    batched = extract_data(str(fixed_offset_export), batch_size=333)
+
+    assert len(whole) == 4900
+    pd.testing.assert_frame_equal(batched, whole)
+
+
+def test_progress_reports_the_running_total(fixed_offset_export):
+    totals = []
+    extract_data(str(fixed_offset_export), batch_size=1000, progress=totals.append)
+
+    assert totals == [1000, 2000, 3000, 4000, 4900]
+
+
+def test_since_keeps_only_newer_records_in_utc(tmp_path):
+    # Créés à 08:00:05, 08:37:05 et 09:14:05 UTC (10:00:05... en heure locale, +0200)
+    path = write_export(tmp_path / "export.xml", heart_rate_records(datetime(2024, 6, 1, 10), 3, offset="+0200"))
+
+    records = extract_data(str(path), since="2024-06-01 08:30:00")
+
+    assert records["startDate"].tolist() == [pd.Timestamp("2024-06-01 08:37"), pd.Timestamp("2024-06-01 09:14")]
+
+
+def test_nested_elements_are_kept_as_json(tmp_path):
+    path = tmp_path / "export.xml"
+    path.write_text(
+        '<HealthData>'
+        '<Record type="HKQuantityTypeIdentifierHeartRate" startDate="2024-01-01 10:00:00 +0100" value="70">'
+        '<MetadataEntry key="HKMetadataKeyHeartRateMotionContext" value="1"/>'
+        '</Record>'
+        '<Record type="HKQuantityTypeIdentifierHeartRate" startDate="2024-01-01 10:05:00 +0100" value="72"/>'
+        '<Workout workoutActivityType="HKWorkoutActivityTypeWalking"><WorkoutEvent type="pause"/></Workout>'
+        '</HealthData>',
+        encoding="utf-8",
+    )
+
+    records = extract_data(str(path))
+
+    assert len(records) == 2
+    assert json.loads(records["MetadataEntry"].iloc[0]) == [{"key": "HKMetadataKeyHeartRateMotionContext", "value": "1"}]
+    assert pd.isna(records["MetadataEntry"].iloc[1])
+
+
+@pytest.fixture
+def exports(tmp_path):
+    """Un premier export, puis le suivant du même utilisateur (mêmes enregistrements et d'autres, plus récents)."""
+    old = heart_rate_records(datetime(2024, 2, 1), 800)
+    new = heart_rate_records(datetime(2024, 3, 1), 600, offset="+0200")
+    yield write_export(tmp_path / "february.xml", old), write_export(tmp_path / "march.xml", old + new)
+    cache.clear()
+
+
+def test_incremental_upload_matches_a_full_upload(exports):
+    february, march = exports
+    with open(february, "rb") as file:
+        cache["february.xml"] = load_upload(file)[0]
+
+    with open(march, "rb") as file:
+        incremental, mode = load_upload(file, base_filename="february.xml")
+    assert mode == "incremental"
+
+    full = RecordStore(extract_data(str(march)))
+    assert len(incremental) == len(full) == 1400
+    for grain in ("hour", "day", "week", "month"):
+        pd.testing.assert_frame_equal(incremental.rollup(HEART_RATE, grain), full.rollup(HEART_RATE, grain), check_dtype=False)
+
+
+def test_identical_upload_is_deduplicated(exports):
+    february, _ = exports
+    with open(february, "rb") as file:
+        store, mode = load_upload(file)
+    assert mode == "full"
+    cache["february.xml"] = store
+
+    with open(february, "rb") as file:
+        again, mode = load_upload(file)
+    assert mode == "deduplicated"
+    assert again is store
@@ -0,0 +1,40 @@
+import os
+import time
+from app.services.forecast_cache import ForecastCache, PURGE_INTERVAL
+
+
+def put_aged(cache, key, age):
+    """Enregistre une prévision et la vieillit de `age` secondes."""
+    cache.put(key, [{"value": 1.0}], 2.5)
+    then = time.time() - age
+    os.utime(cache._path(key), (then, then))
+
+
+def test_entries_round_trip_until_they_expire(tmp_path):
+    cache = ForecastCache(str(tmp_path), ttl_seconds=60, max_entries=0)
+    put_aged(cache, "fresh", 10)
+    put_aged(cache, "stale", 120)
+
+    assert cache.get("fresh") == ([{"value": 1.0}], 2.5)
+    assert cache.get("missing") is None
+    assert cache.stats()["entries"] == 1
+
+
+def test_oldest_entries_beyond_the_cap_are_purged(tmp_path):
+    cache = ForecastCache(str(tmp_path), ttl_seconds=0, max_entries=5)
+    for position in range(12):
+        put_aged(cache, str(position), 100 - position)
+
+    stats = cache.stats()
+
+    assert stats["entries"] == 5
+    assert [cache.get(str(position)) is not None for position in range(12)] == [False] * 7 + [True] * 5
+
+
+def test_writes_purge_the_directory(tmp_path):
+    cache = ForecastCache(str(tmp_path), ttl_seconds=0, max_entries=3)
+    for position in range(PURGE_INTERVAL + 1):
+        put_aged(cache, str(position), 1000 - position)
+
+    # La purge suit la première écriture de chaque série de PURGE_INTERVAL
+    assert len(os.listdir(tmp_path)) == 3
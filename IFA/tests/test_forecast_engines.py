@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.forecast_engines import get_engine
+
+# Horizon fixe du modèle Granite TTM (et du service Watsonx simulé)
+HORIZON = 96
+
+
+def hourly_series(values, start="2024-01-01 00:00"):
+    return pd.DataFrame({
+        "date": pd.date_range(start, periods=len(values), freq="h").strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "value": values,
+    })
+
+
+def daily_cycle(days, level=70.0):
+    return level + 10 * np.sin(np.arange(24 * days) * 2 * np.pi / 24)
+
+
+@pytest.mark.parametrize("name", ["seasonal_naive", "ridge", "watsonx"])
+def test_forecast_continues_the_series(name):
+    data = hourly_series(daily_cycle(14))
+
+    forecast = get_engine(name).predict(data, "date", "value", "1h", HORIZON)
+
+    assert forecast["date"][0] == "2024-01-15T00:00:00Z"
+    assert len(forecast["date"]) == len(forecast["value"]) == HORIZON
+    # Cycle journalier sans bruit : chaque moteur le prolonge
+    np.testing.assert_allclose(forecast["value"], daily_cycle(4), atol=0.5)
+
+
+def test_seasonal_naive_repeats_the_last_day():
+    values = np.arange(48, dtype="float64")
+    forecast = get_engine("seasonal_naive").predict(hourly_series(values), "date", "value", "1h", 30)
+
+    assert forecast["value"] == values[24:].tolist() + values[24:30].tolist()
+
+
+@pytest.mark.parametrize("name", ["ridge", "watsonx"])
+def test_many_series_match_one_at_a_time(name):
+    engine = get_engine(name)
+    frames = [hourly_series(daily_cycle(10, level)) for level in (60.0, 75.0)]
+    frames.append(hourly_series(daily_cycle(12, 90.0)))
+
+    together = engine.predict_many(frames, "date", "value", "1h", HORIZON)
+
+    for frame, forecast in zip(frames, together):
+        alone = engine.predict(frame, "date", "value", "1h", HORIZON)
+        assert forecast["date"] == alone["date"]
+        np.testing.assert_allclose(forecast["value"], alone["value"])
+
+
+def test_ridge_needs_more_points_than_the_horizon():
+    with pytest.raises(ValueError):
+        get_engine("ridge").predict(hourly_series(np.ones(HORIZON)), "date", "value", "1h", HORIZON)
@@ -0,0 +1,49 @@
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.file_parser import extract_data
+from app.services.record_store import RecordStore
+from app.utils import process_data, compute_metrics
+
+
+def baseline_process_data(df_records, identifier):
+    """process_data d'origine, sur les enregistrements bruts (chaînes) de l'export."""
+    df_filtered = df_records[df_records['type'] == identifier].copy()
+    df_filtered['startDate'] = pd.to_datetime(df_filtered['startDate'])
+    df_filtered['value'] = pd.to_numeric(df_filtered['value'], errors='coerce')
+    df_filtered['day'] = df_filtered['startDate'].dt.date
+    df_filtered['week'] = df_filtered['startDate'].dt.to_period('W').astype(str)
+    df_filtered['month'] = df_filtered['startDate'].dt.to_period('M').astype(str)
+
+    daily_avg = df_filtered.groupby('day')['value'].mean().reset_index().rename(columns={'value': 'daily_avg'})
+    weekly_avg = df_filtered.groupby('week')['value'].mean().reset_index().rename(columns={'value': 'weekly_avg'})
+    monthly_avg = df_filtered.groupby('month')['value'].mean().reset_index().rename(columns={'value': 'monthly_avg'})
+    return daily_avg, weekly_avg, monthly_avg
+
+
+@pytest.mark.filterwarnings("ignore:Converting to PeriodArray")
+@pytest.mark.parametrize("identifier", ["HKQuantityTypeIdentifierHeartRate", "HKQuantityTypeIdentifierOxygenSaturation"])
+def test_process_data_matches_baseline_on_fixed_offset_export(fixed_offset_export, identifier):
+    raw = pd.DataFrame([record.attrib for record in ET.parse(fixed_offset_export).getroot().iter("Record")])
+    store = RecordStore(extract_data(str(fixed_offset_export)))
+
+    expected = baseline_process_data(raw, identifier)
+    actual = process_data(store, identifier)
+
+    for expected_frame, actual_frame in zip(expected, actual):
+        assert list(actual_frame.columns) == list(expected_frame.columns)
+        assert actual_frame.iloc[:, 0].astype(str).tolist() == expected_frame.iloc[:, 0].astype(str).tolist()
+        np.testing.assert_allclose(actual_frame.iloc[:, 1], expected_frame.iloc[:, 1])
+
+    # Métriques globales identiques (moyenne des journées et évolution moyenne)
+    np.testing.assert_allclose(compute_metrics(actual[0].copy()), compute_metrics(expected[0].copy()))
+
+
+def test_first_local_day_is_not_shifted_to_utc(fixed_offset_export):
+    store = RecordStore(extract_data(str(fixed_offset_export)))
+    daily_avg, weekly_avg, monthly_avg = process_data(store, "HKQuantityTypeIdentifierHeartRate")
+
+    assert str(daily_avg["day"].iloc[0]) == "2024-01-01"
+    assert monthly_avg["month"].iloc[0] == "2024-01"
+    assert weekly_avg["week"].iloc[0] == "2024-01-01/2024-01-07"
@@ -0,0 +1,52 @@
+from datetime import datetime
+import pandas as pd
+import pytest
+from app.services.file_parser import extract_data
+from app.services.record_query import RecordQuery, QueryError, encode_cursor, decode_cursor
+from app.services.record_store import RecordStore
+from conftest import heart_rate_records, write_export
+
+
+@pytest.fixture
+def store(tmp_path):
+    records = heart_rate_records(datetime(2024, 1, 1), 250)
+    records += heart_rate_records(datetime(2024, 1, 1), 120, identifier="HKQuantityTypeIdentifierRespiratoryRate")
+    return RecordStore(extract_data(str(write_export(tmp_path / "export.xml", records))))
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("0123abcd", 4096)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "0123abcd") == 4096
+
+
+def test_invalid_cursor_is_a_bad_request():
+    with pytest.raises(QueryError) as error:
+        decode_cursor("@@not-a-cursor@@", "v1")
+    assert error.value.status_code == 400
+
+
+def test_cursor_of_another_version_has_expired():
+    with pytest.raises(QueryError) as error:
+        decode_cursor(encode_cursor("v1", 10), "v2")
+    assert error.value.status_code == 410
+
+
+@pytest.mark.parametrize("types, start", [
+    (None, None),
+    (["HKQuantityTypeIdentifierRespiratoryRate"], None),
+    (None, "2024-01-01T03:00:00+01:00"),
+])
+def test_pages_cover_the_selection_exactly_once(store, types, start):
+    query = RecordQuery(store, types=types, start=start, chunk_rows=64)
+    expected, _ = query.page()
+
+    pages, cursor = [], None
+    while True:
+        page, cursor = query.page(cursor, limit=45)
+        pages.append(page)
+        if cursor is None:
+            break
+
+    assert all(len(page) <= 45 for page in pages)
+    pd.testing.assert_frame_equal(pd.concat(pages), expected)
@@ -0,0 +1,104 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.file_parser import extract_data
+from app.services.record_store import RecordStore, OFFSET_COLUMN, utc_offsets
+from app.utils import compute_kpis_batch, process_data, process_series, compute_metrics
+from conftest import heart_rate_records, write_export
+
+HEART_RATE = "HKQuantityTypeIdentifierHeartRate"
+OXYGEN = "HKQuantityTypeIdentifierOxygenSaturation"
+
+
+@pytest.fixture
+def mixed_offset_store(tmp_path):
+    """Enregistrements en +0100 (hiver) puis en +0200 (été), tous proches de minuit en heure locale."""
+    records = heart_rate_records(datetime(2024, 1, 10, 0, 15), 3, step_minutes=30)
+    records += heart_rate_records(datetime(2024, 7, 10, 0, 45), 3, step_minutes=30, offset="+0200")
+    records += heart_rate_records(datetime(2024, 7, 10, 23, 50), 2, step_minutes=20, offset="+0200", identifier=OXYGEN)
+    return RecordStore(extract_data(str(write_export(tmp_path / "export.xml", records))))
+
+
+def test_dates_are_utc_and_offsets_are_kept(mixed_offset_store):
+    heart_rate = mixed_offset_store.records_for(HEART_RATE)
+
+    assert heart_rate["startDate"].iloc[0] == pd.Timestamp("2024-01-09 23:15")
+    assert heart_rate["startDate"].iloc[3] == pd.Timestamp("2024-07-09 22:45")
+    assert heart_rate[OFFSET_COLUMN].tolist() == [60, 60, 60, 120, 120, 120]
+
+
+def test_utc_offsets_of_strings_and_aware_dates():
+    strings = pd.Series(["2024-01-01 00:00:00 +0100", "2024-07-01 00:00:00 -0430", "not a date"])
+    assert utc_offsets(strings).tolist() == [60, -270, 0]
+
+    aware = pd.Series(pd.to_datetime(["2024-01-01 00:00", "2024-07-01 00:00"]).tz_localize("Europe/Paris"))
+    assert utc_offsets(aware).tolist() == [60, 120]
+
+
+def test_days_follow_the_local_calendar(mixed_offset_store):
+    daily = mixed_offset_store.rollup(HEART_RATE, "day")
+
+    # En UTC, ces enregistrements tomberaient la veille (9 janvier, 9 juillet)
+    assert [str(day.date()) for day in daily.index] == ["2024-01-10", "2024-07-10"]
+    assert daily["count"].tolist() == [3, 3]
+
+    daily_avg, _, monthly_avg = process_data(mixed_offset_store, HEART_RATE)
+    assert [str(day) for day in daily_avg["day"]] == ["2024-01-10", "2024-07-10"]
+    assert monthly_avg["month"].tolist() == ["2024-01", "2024-07"]
+
+
+def test_local_windows_select_local_days(mixed_offset_store):
+    start, end = pd.Timestamp("2024-07-10"), pd.Timestamp("2024-07-11")
+
+    records = mixed_offset_store.records_between(HEART_RATE, start, end)
+    assert len(records) == 3
+
+    # Fenêtre alignée (cube) et fenêtre quelconque (enregistrements) donnent les mêmes périodes
+    aligned = mixed_offset_store.window_rollup(HEART_RATE, "hour", start, end)
+    unaligned = mixed_offset_store.window_rollup(HEART_RATE, "hour", start, end - pd.Timedelta(minutes=1))
+    pd.testing.assert_frame_equal(aligned, unaligned, check_dtype=False, check_freq=False)
+    assert aligned.index[0] == pd.Timestamp("2024-07-10 00:00")
+
+
+@pytest.mark.parametrize("start, end, granularity", [
+    (None, None, None),
+    (pd.Timestamp("2024-07-01"), None, "hour"),
+    (pd.Timestamp("2024-07-10 00:50"), pd.Timestamp("2024-07-11 12:00"), "15min"),
+])
+def test_batch_matches_single_type_kpis(mixed_offset_store, start, end, granularity):
+    identifiers = [HEART_RATE, OXYGEN, "HKQuantityTypeIdentifierVO2Max"]
+    kpis = compute_kpis_batch(mixed_offset_store, identifiers, start, end, granularity)
+
+    assert list(kpis) == identifiers
+    for identifier in identifiers:
+        daily_avg, weekly_avg, monthly_avg, overall_avg, overall_avg_ev, series = kpis[identifier]
+        expected = process_data(mixed_offset_store, identifier, start, end)
+
+        pd.testing.assert_frame_equal(weekly_avg, expected[1])
+        pd.testing.assert_frame_equal(monthly_avg, expected[2])
+        if identifier in mixed_offset_store.partitions:
+            assert (overall_avg, overall_avg_ev) == compute_metrics(expected[0])
+        else:
+            assert (overall_avg, overall_avg_ev) == (None, None)
+        pd.testing.assert_frame_equal(daily_avg, expected[0])
+
+        expected_series = process_series(mixed_offset_store, identifier, granularity, start, end)
+        if expected_series is None:
+            assert series is None
+        else:
+            pd.testing.assert_frame_equal(series, expected_series, check_dtype=False)
+
+
+def test_extend_matches_a_full_rebuild(tmp_path):
+    old = heart_rate_records(datetime(2024, 3, 1), 500)
+    new = heart_rate_records(datetime(2024, 3, 20), 500, offset="+0200")
+    base = RecordStore(extract_data(str(write_export(tmp_path / "old.xml", old))))
+    full = RecordStore(extract_data(str(write_export(tmp_path / "full.xml", old + new))))
+
+    extended = base.extend(extract_data(str(write_export(tmp_path / "new.xml", new))))
+
+    assert len(extended) == len(full)
+    for grain in ("hour", "day", "week", "month"):
+        pd.testing.assert_frame_equal(extended.rollup(HEART_RATE, grain), full.rollup(HEART_RATE, grain), check_dtype=False)
+    np.testing.assert_array_equal(extended.time_index(HEART_RATE)[0], full.time_index(HEART_RATE)[0])
@@ -0,0 +1,62 @@
+from datetime import datetime
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.compression import CompressionMiddleware
+from app.routes.cache_handler import router as cache_router, cache, load_upload
+from app.routes.heart import router as heart_router
+from conftest import heart_rate_records, write_export
+
+HEART_URL = "/heart/upload/?filename=export.xml"
+
+
+@pytest.fixture
+def client(tmp_path):
+    records = heart_rate_records(datetime(2024, 1, 1), 3000)
+    with open(write_export(tmp_path / "export.xml", records), "rb") as file:
+        cache["export.xml"] = load_upload(file)[0]
+
+    app = FastAPI()
+    app.include_router(heart_router)
+    app.include_router(cache_router)
+    app.add_middleware(CompressionMiddleware)
+    yield TestClient(app)
+    cache.clear()
+
+
+@pytest.mark.parametrize("encoding, suffix", [("br", "-br"), ("gzip", "-gzip"), ("identity", "")])
+def test_revalidation_with_the_encoded_etag_is_not_modified(client, encoding, suffix):
+    response = client.get(HEART_URL, headers={"Accept-Encoding": encoding})
+    etag = response.headers["etag"]
+
+    assert response.status_code == 200
+    assert etag.endswith(f'{suffix}"')
+    assert response.headers.get("content-encoding", "identity") == encoding
+
+    # Le client renvoie l'ETag suffixé tel qu'il l'a reçu, au milieu d'autres
+    revalidated = client.get(HEART_URL, headers={"Accept-Encoding": encoding, "If-None-Match": f'"other", {etag}'})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == etag
+    assert revalidated.content == b""
+
+    changed = client.get(HEART_URL, headers={"Accept-Encoding": encoding, "If-None-Match": '"other"'})
+    assert changed.status_code == 200
+
+
+def test_unknown_file_is_not_found(client):
+    assert client.get("/heart/upload/?filename=missing.xml").status_code == 404
+    assert client.get("/data/missing.xml").status_code == 404
+
+
+def test_data_pages_and_expired_cursor(client, tmp_path):
+    first = client.get("/data/export.xml?limit=1000").json()
+    assert len(first["data"]) == 1000
+
+    second = client.get(f"/data/export.xml?limit=1000&cursor={first['next_cursor']}").json()
+    assert second["data"][0] != first["data"][-1]
+
+    # Le fichier est remplacé par un autre export : l'ancien curseur a expiré
+    with open(write_export(tmp_path / "other.xml", heart_rate_records(datetime(2024, 6, 1), 10)), "rb") as file:
+        cache["export.xml"] = load_upload(file)[0]
+    expired = client.get(f"/data/export.xml?limit=1000&cursor={first['next_cursor']}")
+    assert expired.status_code == 410